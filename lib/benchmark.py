@@ -1,196 +1,701 @@
 import json
+import multiprocessing
 import time
 import os
-import subprocess
+import shlex
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import lib.cache as cache
+import lib.cwe_index as cwe_index
+import lib.filtered_store as filtered_store
 import lib.output_parser as output_parser
+import lib.pot_flaws as pot_flaws
+import lib.scheduler as scheduler
+import lib.tail as tail
+import lib.tool_runner as tool_runner
+import lib.tracing as tracing
 
 debug = False
-cwetree = {}
-
-
-def get_cmd(tool, codedir, outdir):
+# format of the filtered data files: json, columnar or columnar-zlib
+output_format = "json"
+# limits of each run of the tools, see tool_runner.run
+limits = {}
+default_limits = {
+    # horusec opens too many files for the usual limit of 1024
+    "horusec": {"max_files": 2048},
+}
+
+
+def get_argv(tool, codedir, outdir):
+    """Get the arguments of the command running the tool on codedir, the
+    output file of the tool and the file of its standard output if the tool
+    writes its report there"""
     if tool != "cppcheck":
         outfile = f"{outdir}/{tool}.json"
     else:
         outfile = f"{outdir}/{tool}.txt"
+    stdout_file = None
     # Get the command to run with the correct tool and test suite
     match tool:
         case "semgrep":
-            command = f"semgrep scan {codedir} --json -o {outfile}"
+            argv = ["semgrep", "scan", codedir, "--json", "-o", outfile]
         case "horusec":
-            command = (
-                f"ulimit -n 2048 && horusec start -p {codedir} -D -O {outfile} -o json"
-            )
+            argv = ["horusec", "start", "-p", codedir, "-D", "-O", outfile]
+            argv += ["-o", "json"]
         case "snyk":
-            command = f"snyk code test {codedir} --json-file-output={outfile}"
+            argv = ["snyk", "code", "test", codedir, f"--json-file-output={outfile}"]
         case "flawfinder":
-            command = f"flawfinder -F --sarif {codedir} > {outfile}"
+            argv = ["flawfinder", "-F", "--sarif", codedir]
+            stdout_file = outfile
         case "cppcheck":
-            command = f"cppcheck --template='{{cwe}}:{{file}}:{{line}}:{{severity}}' -q {codedir} --output-file={outfile}"
+            argv = ["cppcheck", "--template={cwe}:{file}:{line}:{severity}", "-q"]
+            argv += [codedir, f"--output-file={outfile}"]
+
+    return argv, outfile, stdout_file
+
 
+def get_cmd(tool, codedir, outdir):
+    """Get the command of get_argv as a shell command line, that is part of
+    the cache key, and the output file of the tool"""
+    argv, outfile, stdout_file = get_argv(tool, codedir, outdir)
+    command = shlex.join(argv)
+    if stdout_file is not None:
+        command += f" > {shlex.quote(stdout_file)}"
     return command, outfile
 
 
+def get_limits(tool, set_limits=None):
+    """Return the limits of the tool runs, the given ones override the defaults.
+    None means no limit"""
+    limits = dict(default_limits.get(tool, {}))
+    for key, value in (set_limits or {}).items():
+        if value is not None:
+            limits[key] = value
+    return limits
+
+
+def add_usage(total_usage, usage):
+    """Add the resource usage of a run to the total one. The peak memory is
+    the greatest one, since the runs don't share their memory, and the total
+    is partial if any run is partial"""
+    for key, value in usage.items():
+        if key == "partial":
+            total_usage[key] = total_usage.get(key, False) or value
+        elif key == "max_rss_mb":
+            total_usage[key] = max(total_usage.get(key, 0), value)
+        else:
+            total_usage[key] = total_usage.get(key, 0) + value
+    return total_usage
+
+
+def get_tool_process(outdir, tool, codedir):
+    """Get the process running the tool on codedir, its output is logged in
+    {outdir}/{tool}.log. The reports written line by line are filtered while
+    the tool writes them"""
+    argv, outfile, stdout_file = get_argv(tool, codedir, outdir)
+    consumer = None
+    if tool in output_parser.stream_filters:
+        # the report of a previous run would be read as the new one
+        if os.path.exists(outfile):
+            os.remove(outfile)
+        consumer = lambda is_done: filter_while_running(tool, outfile, is_done)
+    return tool_runner.ToolProcess(
+        name=f"{tool} on {codedir}",
+        argv=argv,
+        log_file=f"{outdir}/{tool}.log",
+        stdout_file=stdout_file,
+        limits=limits,
+        # snyk prints too much
+        echo=debug and tool != "snyk",
+        consumer=consumer,
+    )
+
+
+def filter_while_running(tool, outfile, is_done):
+    """Filter the report of the tool while it's written, return None if it
+    can't be, then it's filtered again when the tool exits"""
+    try:
+        with tail.TailFile(outfile, is_done) as f:
+            return output_parser.stream_filters[tool](f)
+    except (OSError, ValueError, KeyError) as e:
+        if debug:
+            print(f"Cannot filter {outfile} while {tool} is running: {e}")
+        return None
+
+
+def filter_output(outdir, tool, codedir, usage, filtered_data=None):
+    """Parse and filter the output of a run of the tool, unless it was
+    filtered while the tool was running. The output of a killed tool is
+    filtered again, the consumer didn't know that it may be truncated"""
+    _, outfile = get_cmd(tool, codedir, outdir)
+    with tracing.span("filter_data", tool=tool, codedir=codedir) as span:
+        if filtered_data is not None and not usage["partial"]:
+            span["while_running"] = True
+        elif usage["partial"]:
+            # Keep whatever the tool wrote before being killed
+            filtered_data = output_parser.filter_partial_data(tool, outfile)
+        else:
+            filtered_data = output_parser.filter_data(tool, outfile)
+        span["findings"] = count_findings(filtered_data)
+    return filtered_data
+
+
 def run_tool(outdir, tool, codedir):
-    command, outfile = get_cmd(tool, codedir, outdir)
     # Execute tool
-    time_start = time.perf_counter()
-    # In snyk always capture output, otherwise it prints too much
-    capture = True if tool == "snyk" else (not debug)
-    proc = subprocess.run(command, capture_output=capture, shell=True)
+    process = get_tool_process(outdir, tool, codedir)
+    with tracing.span("tool", tool=tool, codedir=codedir) as span:
+        [(returncode, usage)] = tool_runner.run([process])
+        span.update(returncode=returncode, partial=usage["partial"])
     if tool == "snyk" and debug:
-        print(f"Snyk returned code {proc.returncode}")
-    time_end = time.perf_counter()
-    elapsed_time = time_end - time_start
+        print(f"Snyk returned code {returncode}")
 
-    # Parse and filter
-    filtered_data = output_parser.filter_data(tool, outfile)
-    with open(f"{outdir}/{tool}_filtered.json", "w") as f:
-        f.write(json.dumps(filtered_data, indent=4))
+    filtered_data = filter_output(
+        outdir, tool, codedir, usage, filtered_data=process.result
+    )
+    aggr_data = write_results(outdir, tool, filtered_data)
+    return usage, filtered_data, aggr_data
+
+
+def get_filtered_file(outdir, tool, format=None):
+    """Get the path of the filtered data file in the given format,
+    by default the current output format"""
+    format = format or output_format
+    ext = "json" if format == "json" else "bin"
+    return f"{outdir}/{tool}_filtered.{ext}"
+
+
+def find_filtered_file(outdir, tool, format=None):
+    """Get the path of the existing filtered data file, preferring the given
+    format (by default the current output format), or None if there isn't any"""
+    for format in [format or output_format, "json", "columnar"]:
+        path = get_filtered_file(outdir, tool, format)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def count_findings(filtered_data):
+    return sum(len(flaws) for flaws in filtered_data.values())
+
+
+def load_filtered(path):
+    """Load filtered data from a JSON or a columnar file"""
+    with tracing.span("load_filtered", path=path) as span:
+        if path.endswith(".bin"):
+            filtered_data = filtered_store.read(path)
+        else:
+            with open(path, "r") as f:
+                filtered_data = json.load(f)
+        span["findings"] = count_findings(filtered_data)
+    return filtered_data
+
+
+def get_shards(codedir, by="sub"):
+    """Split the Juliet suite in codedir in folders that can be analyzed
+    independently. With by="cwe" every CWE directory is a shard, with by="sub"
+    every folder that directly contains testcases (like the s01, s02, ...
+    subfolders of the CWE directories) is a shard"""
+    shards = []
+    codedir = codedir.rstrip("/")
+    for root, dirs, files in os.walk(codedir):
+        dirs.sort()
+        # skip ant build directories, they don't contain testcases
+        if "antbuild" in dirs:
+            dirs.remove("antbuild")
+
+        dirname = os.path.basename(root)
+        if by == "cwe" and dirname.startswith("CWE"):
+            # the whole CWE directory is a shard, don't go deeper
+            shards.append(root)
+            dirs.clear()
+        elif by != "cwe" and any(file.startswith("CWE") for file in files):
+            shards.append(root)
+
+    return shards
+
+
+def get_shard_name(codedir, shard):
+    """Get the name of a shard from its path in the suite"""
+    name = os.path.relpath(shard, codedir).replace("/", "_")
+    if name == ".":
+        name = os.path.basename(shard.rstrip("/"))
+    return name
+
+
+def get_shard_outdir(outdir, codedir, shard):
+    return f"{outdir}/shards/{get_shard_name(codedir, shard)}"
+
+
+def get_shard_state(shard, old_state=None):
+    """Get modification time, size and hash of every file in the shard.
+    The hash in old_state is reused if mtime and size of the file didn't change"""
+    old_state = old_state or {}
+    state = {}
+    for root, _, files in os.walk(shard):
+        for file in files:
+            path = os.path.join(root, file)
+            relpath = os.path.relpath(path, shard)
+            stat = os.stat(path)
+            old = old_state.get(relpath)
+            if old and old["mtime"] == stat.st_mtime and old["size"] == stat.st_size:
+                sha = old["sha"]
+            else:
+                sha = cache.hash_file(path).hexdigest()
+            state[relpath] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha": sha}
+    return state
 
-    # Aggregate
-    aggr_data = output_parser.aggregate_cwe(filtered_data)
-    with open(f"{outdir}/{tool}_vulns.json", "w") as f:
-        f.write(json.dumps(aggr_data, indent=4, sort_keys=True))
 
-    return elapsed_time, filtered_data, aggr_data
+def save_shard_state(outdir, state):
+    with open(f"{outdir}/state.json", "w") as f:
+        f.write(json.dumps(state, indent=4, sort_keys=True))
 
 
-def run_horusec(outdir, tool, codedir):
-    total_time = 0
-    total_filtered_data = {}
-    total_aggr_data = {"total": 0, "vulns": {}}
+def get_shard_run(tool, shard, version, parser):
+    """Get what the results of a shard depend on besides its files: the
+    command line and the version of the tool, and the output parser"""
+    command, _ = get_cmd(tool, shard, "{outdir}")
+    return {"command": command, "version": version, "parser": parser}
 
-    folders = []
-    for root, dirs, files in os.walk(codedir):
-        # skip antbuild and skip subfolder (which are already included)
-        if "antbuild" in root or "s0" in root or "s1" in root:
-            continue
-        if "src" in dirs or "testcases" in dirs:
-            continue
-        if "s01" in dirs:
-            for subdir in dirs:
-                folders.append(f"{root}/{subdir}")
-        elif root != codedir:
-            folders.append(root)
-
-    for folder in folders:
-        # Run on the directory
-        run_time, run_filtered_data, run_aggr_data = run_tool(
-            outdir=outdir, tool=tool, codedir=folder
+
+def is_shard_changed(outdir, tool, shard, run):
+    """Return true if the files of the shard or its run (see get_shard_run)
+    changed since its last run, or if the shard was never run"""
+    if not os.path.isfile(f"{outdir}/state.json"):
+        return True
+    if find_filtered_file(outdir, tool) is None:
+        return True
+
+    with open(f"{outdir}/state.json", "r") as f:
+        old_state = json.load(f)
+    # The states of the older versions have only the files
+    if old_state.get("run") != run:
+        return True
+    old_files = old_state["files"]
+    files = get_shard_state(shard, old_files)
+    old_hashes = {relpath: file["sha"] for relpath, file in old_files.items()}
+    hashes = {relpath: file["sha"] for relpath, file in files.items()}
+    if old_hashes != hashes:
+        return True
+
+    # Save the new modification times, to avoid hashing the files again
+    save_shard_state(outdir, {"run": run, "files": files})
+    return False
+
+
+def filter_shard(
+    outdir,
+    tool,
+    codedir,
+    usage,
+    state,
+    filtered_data=None,
+    set_debug=False,
+    set_format="json",
+):
+    """Filter the output of the run of the tool on a shard, unless it was
+    filtered while the tool was running, and write it for the incremental
+    runs. The results of the whole suite are aggregated after the merge"""
+    global debug, output_format
+    debug = set_debug
+    output_format = set_format
+
+    with tracing.span("shard", tool=tool, shard=codedir):
+        filtered_data = filter_output(
+            outdir, tool, codedir, usage, filtered_data=filtered_data
+        )
+        write_filtered(outdir, tool, filtered_data)
+    # Record the analyzed files, for the incremental runs, unless the run
+    # was killed and must be done again. Without a state (the run is not
+    # incremental) the one of an older run doesn't match the new results
+    if state is not None and not usage["partial"]:
+        save_shard_state(outdir, state)
+    elif os.path.exists(f"{outdir}/state.json"):
+        os.remove(f"{outdir}/state.json")
+    return filtered_data
+
+
+def merge_results(total_filtered_data, filtered_data):
+    """Merge the filtered data of a shard into the total filtered data"""
+    for filename, flaws in filtered_data.items():
+        total_filtered_data[filename] = total_filtered_data.get(filename, [])
+        total_filtered_data[filename].extend(flaws)
+    return total_filtered_data
+
+
+def merge_shards(shards, shards_filtered_data):
+    """Merge the filtered data of the shards, in the shards order, so the
+    output doesn't depend on timing. The findings of files with the same name
+    in different shards are kept together, and the files are reported"""
+    total_filtered_data = {}
+    file_shards = {}
+    for shard in shards:
+        # number of files of this shard already found in each previous shard
+        collisions = {}
+        for filename in shards_filtered_data[shard]:
+            if filename in file_shards:
+                other = file_shards[filename]
+                collisions[other] = collisions.get(other, 0) + 1
+            else:
+                file_shards[filename] = shard
+        for other, count in collisions.items():
+            print(
+                f"{count} files of {shard} have the same name of files in {other}, "
+                + "their findings are merged"
+            )
+        merge_results(total_filtered_data, shards_filtered_data[shard])
+    return total_filtered_data
+
+
+def remove_other_formats(outdir, tool):
+    """Remove the filtered data file of the formats not in use, left by a
+    previous run, so it's not read instead of the current one"""
+    current = get_filtered_file(outdir, tool)
+    for format in ["json", "columnar"]:
+        path = get_filtered_file(outdir, tool, format)
+        if path != current and os.path.exists(path):
+            os.remove(path)
+
+
+def write_filtered(outdir, tool, filtered_data):
+    """Write the filtered data in the output format"""
+    remove_other_formats(outdir, tool)
+    if output_format == "json":
+        with open(f"{outdir}/{tool}_filtered.json", "w", encoding="UTF-8") as f:
+            f.write(json.dumps(filtered_data, indent=4))
+    else:
+        filtered_store.write(
+            get_filtered_file(outdir, tool),
+            filtered_data,
+            compress=output_format == "columnar-zlib",
         )
 
-        # Aggregate results
-        total_time += run_time
-        total_filtered_data.update(run_filtered_data)
-        total_aggr_data["total"] += run_aggr_data["total"]
-        for cwe, cwe_count in run_aggr_data["vulns"].items():
-            total_aggr_data["vulns"][cwe] = (
-                total_aggr_data["vulns"].get(cwe, 0) + cwe_count
+
+def write_results(outdir, tool, filtered_data):
+    """Aggregate the filtered data and write both to the output directory"""
+    findings = count_findings(filtered_data)
+    with tracing.span("aggregate_cwe", tool=tool, findings=findings):
+        aggr_data = output_parser.aggregate_cwe(filtered_data)
+    with tracing.span(
+        "write_results", tool=tool, findings=findings, format=output_format
+    ):
+        write_filtered(outdir, tool, filtered_data)
+        with open(f"{outdir}/{tool}_vulns.json", "w", encoding="UTF-8") as f:
+            f.write(json.dumps(aggr_data, indent=4, sort_keys=True))
+    return aggr_data
+
+
+def get_shards_parser(tool, jobs, num_shards):
+    """Get the executor filtering the shards. The horusec shards are small and
+    many, a single thread filters them loading the rules once. The reports of
+    the other tools are filtered in parallel by a pool of processes, started
+    by a fork server since the event loop has other threads"""
+    workers = min(scheduler.get_workers(jobs), num_shards)
+    if tool == "horusec" or workers <= 1:
+        return ThreadPoolExecutor(max_workers=1)
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+    )
+
+
+def run_sharded(outdir, tool, codedir, by="sub", jobs=1, incremental=False):
+    """Run the tool on each shard of the suite, `jobs` shards at a time,
+    filter the output of each shard as soon as it's ready, and write the
+    merged results in the output directory once.
+    If incremental, only the shards whose files changed since their last run
+    are run again, and the results of the other ones are reused.
+    The returned usage is the sum of the resources used by the shards, and
+    the time is the sum of the tool times if the shards run one at a time,
+    otherwise the wall-clock time of the whole run. If incremental, it has
+    the number of shards run and of all the shards"""
+    shards = get_shards(codedir, by=by)
+    if len(shards) == 0:
+        return run_tool(outdir=outdir, tool=tool, codedir=codedir)
+
+    shards_args = [
+        {
+            "outdir": get_shard_outdir(outdir, codedir, shard),
+            "tool": tool,
+            "codedir": shard,
+        }
+        for shard in shards
+    ]
+
+    shards_filtered_data = {}
+    if incremental:
+        version = cache.get_tool_version(tool)
+        parser = cache.hash_parser()
+        runs = {shard: get_shard_run(tool, shard, version, parser) for shard in shards}
+        changed_args = []
+        with tracing.span("check_shards", tool=tool, shards=len(shards)) as span:
+            for args in shards_args:
+                if is_shard_changed(
+                    args["outdir"], tool, args["codedir"], runs[args["codedir"]]
+                ):
+                    changed_args.append(args)
+                    continue
+                # Reuse the results of the previous run of the shard
+                path = find_filtered_file(args["outdir"], tool)
+                shards_filtered_data[args["codedir"]] = load_filtered(path)
+            span["changed"] = len(changed_args)
+        print(f"Running {tool} on {len(changed_args)} of {len(shards)} shards")
+        shards_args = changed_args
+
+    # The tool runs on the shards from a single event loop, and each shard
+    # is filtered as soon as its tool exits, while the tool runs on the other
+    # shards
+    time_start = time.perf_counter()
+    processes = []
+    for args in shards_args:
+        os.makedirs(args["outdir"], exist_ok=True)
+        # Hashing the files is needed only by the incremental runs
+        args["state"] = None
+        if incremental:
+            args["state"] = {
+                "run": runs[args["codedir"]],
+                "files": get_shard_state(args["codedir"]),
+            }
+        processes.append(get_tool_process(args["outdir"], tool, args["codedir"]))
+
+    total_usage = {"time_sec": 0, "partial": False}
+    filtering = {}
+    with get_shards_parser(tool, jobs, len(processes)) as parser:
+
+        def on_done(i, returncode, usage):
+            args = shards_args[i]
+            if debug:
+                print(f"Shard {args['codedir']} done, returned {returncode}")
+            add_usage(total_usage, usage)
+            process = processes[i]
+            tracing.record(
+                "tool",
+                process.time_start,
+                process.time_end,
+                tool=tool,
+                shard=args["codedir"],
+                returncode=returncode,
+                partial=usage["partial"],
+            )
+            filtering[args["codedir"]] = parser.submit(
+                filter_shard,
+                **args,
+                usage=usage,
+                filtered_data=process.result,
+                set_debug=debug,
+                set_format=output_format,
             )
 
+        if processes:
+            with tracing.span("tools", tool=tool, shards=len(processes)):
+                tool_runner.run(processes, jobs=jobs, on_done=on_done)
+    for shard, future in filtering.items():
+        shards_filtered_data[shard] = future.result()
+    if scheduler.get_workers(jobs) > 1:
+        total_usage["time_sec"] = time.perf_counter() - time_start
+    if incremental:
+        # The usage is the one of the changed shards only
+        total_usage.update(
+            incremental=True, shards_changed=len(shards_args), shards_total=len(shards)
+        )
+
+    with tracing.span("merge_shards", tool=tool, shards=len(shards)):
+        total_filtered_data = merge_shards(shards, shards_filtered_data)
+
     # Override previous json outputs
-    with open(f"{outdir}/{tool}_filtered.json", "w", encoding="UTF-8") as f:
-        f.write(json.dumps(total_filtered_data, indent=4))
-    with open(f"{outdir}/{tool}_vulns.json", "w", encoding="UTF-8") as f:
-        f.write(json.dumps(total_aggr_data, indent=4, sort_keys=True))
+    total_aggr_data = write_results(outdir, tool, total_filtered_data)
 
-    return total_time, total_filtered_data, total_aggr_data
+    return total_usage, total_filtered_data, total_aggr_data
 
 
-def run(outdir, tool, codedir, set_debug=False):
+def run_horusec(outdir, tool, codedir, jobs=1, incremental=False):
+    # horusec can't analyze the whole suite at once, always split it
+    return run_sharded(
+        outdir=outdir,
+        tool=tool,
+        codedir=codedir,
+        by="sub",
+        jobs=jobs,
+        incremental=incremental,
+    )
 
-    global debug
-    debug = set_debug
 
+def run_uncached(outdir, tool, codedir, shard=None, shard_jobs=1, incremental=False):
     if tool == "horusec":
         return run_horusec(
             outdir=outdir,
             tool=tool,
             codedir=codedir,
+            jobs=shard_jobs,
+            incremental=incremental,
+        )
+    elif shard is not None:
+        return run_sharded(
+            outdir=outdir,
+            tool=tool,
+            codedir=codedir,
+            by=shard,
+            jobs=shard_jobs,
+            incremental=incremental,
         )
     else:
         return run_tool(outdir=outdir, tool=tool, codedir=codedir)
 
 
-def is_cwe_ancestor(cwe, ancestor):
-    """Returns true if the given ancestor is an ancestor of the given cwe
-    or the cwe and the ancestor are equal"""
-    if cwe == ancestor:
-        return True
+def restore_cached(outdir, tool, key, meta):
+    """Restore the outputs of a cached run in the output directory, and
+    return the resource usage of the cached run, marked as cached"""
+    cache.restore(key, outdir)
+    remove_other_formats(outdir, tool)
+    for name in meta["shards"]:
+        remove_other_formats(f"{outdir}/shards/{name}", tool)
+    # The older entries have only the time. The usage is the one of the
+    # cached run, not a new measurement
+    usage = meta.get("usage", {"time_sec": meta["time_sec"], "partial": False})
+    usage = dict(usage, cached=True)
+    if meta["parser"] == cache.hash_parser():
+        filtered_data = load_filtered(find_filtered_file(outdir, tool))
+        with open(f"{outdir}/{tool}_vulns.json", "r") as f:
+            aggr_data = json.load(f)
+        return usage, filtered_data, aggr_data
+
+    # The parser changed since the run was cached, filter the raw outputs again
+    if debug:
+        print("Output parser changed, filtering again the cached outputs")
+    if len(meta["shards"]) > 0:
+        filtered_data = {}
+        for name in meta["shards"]:
+            shard_outdir = f"{outdir}/shards/{name}"
+            _, outfile = get_cmd(tool, "", shard_outdir)
+            shard_filtered_data = output_parser.filter_data(tool, outfile)
+            write_filtered(shard_outdir, tool, shard_filtered_data)
+            merge_results(filtered_data, shard_filtered_data)
+    else:
+        _, outfile = get_cmd(tool, "", outdir)
+        filtered_data = output_parser.filter_data(tool, outfile)
+    aggr_data = write_results(outdir, tool, filtered_data)
+
+    # Update the entry, so the next run doesn't need to filter again
+    cache.store(key, outdir, meta["outputs"], meta)
+
+    return usage, filtered_data, aggr_data
+
+
+def run(
+    outdir,
+    tool,
+    codedir,
+    set_debug=False,
+    shard=None,
+    shard_jobs=1,
+    use_cache=False,
+    incremental=False,
+    set_format="json",
+    set_limits=None,
+):
+
+    global debug, output_format, limits
+    debug = set_debug
+    output_format = set_format
+    limits = get_limits(tool, set_limits)
+
+    # The incremental runs need the state of each shard
+    if incremental and shard is None:
+        shard = "cwe"
+
+    if not use_cache:
+        return run_uncached(
+            outdir,
+            tool,
+            codedir,
+            shard=shard,
+            shard_jobs=shard_jobs,
+            incremental=incremental,
+        )
 
-    for parent in cwetree.get(cwe, []):
-        if is_cwe_ancestor(parent, ancestor):
-            return True
-    return False
+    # Search the results in the cache, the output directory is not part of the key
+    if tool == "horusec":
+        shard = "sub"
+    command, outfile = get_cmd(tool, codedir, "{outdir}")
+    key = cache.get_key(tool, command, codedir, shard=shard, format=output_format)
+    meta = cache.lookup(key)
+    if meta is not None:
+        print(f"Restoring results of {tool} on {codedir} from cache")
+        with tracing.span("restore_cached", tool=tool, codedir=codedir):
+            return restore_cached(outdir, tool, key, meta)
+
+    usage, filtered_data, aggr_data = run_uncached(
+        outdir,
+        tool,
+        codedir,
+        shard=shard,
+        shard_jobs=shard_jobs,
+        incremental=incremental,
+    )
 
+    # The results of a killed run are not complete, don't save them
+    if usage["partial"]:
+        return usage, filtered_data, aggr_data
+
+    # Save raw, filtered and aggregated outputs of this run in the cache
+    shards = []
+    if shard is not None:
+        shards = [get_shard_name(codedir, s) for s in get_shards(codedir, by=shard)]
+    outputs = [
+        os.path.basename(outfile),
+        os.path.basename(get_filtered_file(outdir, tool)),
+        f"{tool}_vulns.json",
+    ]
+    outputs += [f"shards/{name}" for name in shards]
+    meta = {
+        "tool": tool,
+        "codedir": codedir,
+        "time_sec": usage["time_sec"],
+        "usage": usage,
+        "shards": shards,
+        "outputs": outputs,
+    }
+    cache.store(key, outdir, outputs, meta)
+
+    return usage, filtered_data, aggr_data
+
+
+def is_cwe_ancestor(cwe, ancestor, cwe_tree):
+    """Returns true if the given ancestor is an ancestor of the given cwe
+    or the cwe and the ancestor are equal, using the CWEIndex cwe_tree"""
+    return cwe_tree.is_ancestor(cwe, ancestor)
 
-def find_vuln_in_manifest_list(vuln, list):
+
+def find_vuln_in_manifest_list(vuln, list, cwe_tree):
     for el in list:
         if vuln["line"] == el["line"]:
             vuln_cwe = vuln["cwe"]
             el_cwe = el["cwe"]
-            if is_cwe_ancestor(vuln_cwe, el_cwe) or is_cwe_ancestor(
-                el_cwe, vuln_cwe, cwetree
-            ):
+            if are_cwe_related(vuln_cwe, el_cwe, cwe_tree):
                 return True
     return False
 
 
-def get_method_line(filename, line, pot_flaws):
-    """Given a filename and a line of a flaw, return the line from the pot_flaws"""
-    greatest = -1
-    # computes the greatest line lower than the given line
-    for flaw in pot_flaws.get(filename, []):
-        if flaw["line"] > line:
-            break
-        greatest = flaw["line"]
-
-    return greatest if greatest != -1 else line
-
-
-def are_cwe_related(first_cwe, second_cwe):
+def are_cwe_related(first_cwe, second_cwe, cwe_tree):
     """Given two CWEs, return if one is an ancestor of the other one"""
-    return is_cwe_ancestor(first_cwe, second_cwe) or is_cwe_ancestor(
-        second_cwe, first_cwe
-    )
+    return cwe_tree.are_related(first_cwe, second_cwe)
 
 
-def find_flaw(flaw_line, flaw_cwe, flaws_list, by_cwe=True):
-    """Given a flaw and a list of flaws, return if the flaw is in the list
-    by comparing by line and CWE relationship"""
-    for index, el in enumerate(flaws_list):
-        el_line = el.get("method_line", el["line"])
-        if flaw_line == el_line:
-            if by_cwe:
-                if are_cwe_related(flaw_cwe, el["cwe"], cwetree):
-                    return el, index
-            else:
-                return el, index
-    return None, -1
-
-
-def is_one_related(cwe, cwes):
+def is_one_related(cwe, cwes, cwe_tree):
     for c in cwes:
-        if are_cwe_related(c, cwe):
+        if are_cwe_related(c, cwe, cwe_tree):
             return True
     return False
 
 
-def confusion_matrix(pot_flaws_dict, sast_flaws_dict, cwe, cwe_tree):
-    global cwetree
-    cwetree = cwe_tree
+def confusion_counts(pot_flaws_index, sast_flaws_dict, cwe, cwe_tree):
+    """Count TP, FP, TN and FN of the SAST flaws against the potential flaws
+    (a PotFlawsIndex), using the CWEIndex cwe_tree. Every file is evaluated
+    independently from the others"""
     tp = 0
     fp = 0
     tn = 0
     fn = 0
 
-    for filename, found_list in sast_flaws_dict.items():
-        for sast_flaw in found_list:
-            sast_flaw["method_line"] = get_method_line(
-                filename, sast_flaw["line"], pot_flaws_dict
-            )
-        found_list.sort(key=lambda d: d["method_line"])
+    # number of potential flaws found by the SAST, per file and method line
+    consumed = {}
 
     # compute positives. Check if true or false by looking at potential flaws
     # for each flaw found from SAST
@@ -199,37 +704,41 @@ def confusion_matrix(pot_flaws_dict, sast_flaws_dict, cwe, cwe_tree):
         juliet_cwe = None
         last_cwes = []
         tp_found_num = 0
-
-        juliet_flaws_num_per_line = {}
-        for juliet_flaw in pot_flaws_dict.get(filename, []):
-            juliet_flaws_num_per_line[juliet_flaw["line"]] = (
-                juliet_flaws_num_per_line.get(juliet_flaw["line"], 0) + 1
-            )
+        file_consumed = consumed[filename] = {}
+
+        # sort the SAST flaws by method line, without modifying them
+        found_list = sorted(
+            (
+                (
+                    pot_flaws_index.get_method_line(filename, sast_flaw["line"]),
+                    sast_flaw,
+                )
+                for sast_flaw in found_list
+            ),
+            key=lambda d: d[0],
+        )
 
         # for each flaw found from SAST in the specified filename
-        for sast_flaw in found_list:
-
-            found, index = find_flaw(
-                sast_flaw["method_line"],
-                sast_flaw["cwe"],
-                pot_flaws_dict.get(filename, []),
-                by_cwe=False,
-            )
-
-            if sast_flaw["method_line"] == last_line:
-                if is_one_related(sast_flaw["cwe"], last_cwes):
+        for method_line, sast_flaw in found_list:
+            # the first potential flaw of the method not found yet, if any
+            juliet_flaws = pot_flaws_index.get_flaws(filename, method_line)
+            consumed_num = file_consumed.get(method_line, 0)
+            found = None
+            if consumed_num < len(juliet_flaws):
+                found = juliet_flaws[consumed_num]
+
+            if method_line == last_line:
+                if is_one_related(sast_flaw["cwe"], last_cwes, cwe_tree):
                     if not found:
-                        if tp_found_num >= juliet_flaws_num_per_line.get(
-                            sast_flaw["method_line"], 0
-                        ):
+                        if tp_found_num >= len(juliet_flaws):
                             continue
             else:
                 last_cwes = []
                 juliet_cwe = None
-                last_line = sast_flaw["method_line"]
+                last_line = method_line
 
             if found:  # found but CWE may not be related
-                are_related = are_cwe_related(sast_flaw["cwe"], found["cwe"])
+                are_related = cwe_tree.are_related(sast_flaw["cwe"], found["cwe"])
                 if found["method"] == "bad" and are_related:
                     tp += 1
                     tp_found_num += 1
@@ -237,35 +746,94 @@ def confusion_matrix(pot_flaws_dict, sast_flaws_dict, cwe, cwe_tree):
                     fp += 1
                 juliet_cwe = found["cwe"]
                 last_cwes.append(sast_flaw["cwe"])
-                pot_flaws_dict.get(filename).pop(index)
+                file_consumed[method_line] = consumed_num + 1
             else:
-                if are_cwe_related(sast_flaw["cwe"], juliet_cwe):
+                if cwe_tree.are_related(sast_flaw["cwe"], juliet_cwe):
                     # i found it but a previous record removed it
                     tp += 1
                     tp_found_num += 1
                 else:
-                    if not is_one_related(sast_flaw["cwe"], last_cwes):
+                    if not is_one_related(sast_flaw["cwe"], last_cwes, cwe_tree):
                         fp += 1
                 last_cwes.append(sast_flaw["cwe"])
 
     # compute negatives, and check if the SAST found or didn't find a negative
     # for each potential flaw
-    for filename, pot_flaws_list in pot_flaws_dict.items():
+    for filename, flaws_per_line in pot_flaws_index.flaws_per_line.items():
         # filter by required CWE, if any
         if cwe is not None:
             curr_cwe = filename.split("_")[0][3:]
             if curr_cwe != cwe:
                 continue
 
-        # for each potential flaw of the file, search if it was found by SAST
-        for pot_flaw in pot_flaws_list:
-            # if the potential flaw is here is because it was not found by SAST
-            # not found by SAST
-            if pot_flaw["method"] == "good":
-                tn += 1  # true negative if it is in a good method
-            else:
-                fn += 1  # false negative if it is in a bad method
+        # for each potential flaw of the file not found by SAST
+        file_consumed = consumed.get(filename, {})
+        for method_line, juliet_flaws in flaws_per_line.items():
+            for pot_flaw in juliet_flaws[file_consumed.get(method_line, 0) :]:
+                if pot_flaw["method"] == "good":
+                    tn += 1  # true negative if it is in a good method
+                else:
+                    fn += 1  # false negative if it is in a bad method
+
+    return {"tp": tp, "fp": fp, "tn": tn, "fn": fn}
+
+
+# CWE tree of the worker processes, set once when each worker starts
+worker_cwe_tree = None
+
+
+def init_confusion_worker(cwe_tree):
+    global worker_cwe_tree
+    worker_cwe_tree = cwe_tree
+
+
+def confusion_counts_worker(pot_flaws_index, sast_flaws_dict, cwe):
+    return confusion_counts(pot_flaws_index, sast_flaws_dict, cwe, worker_cwe_tree)
+
+
+def confusion_matrix(pot_flaws_dict, sast_flaws_dict, cwe, cwe_tree, jobs=1):
+    """Compute the confusion matrix of the SAST flaws against the Juliet
+    potential flaws. pot_flaws_dict is a PotFlawsIndex or the plain potential
+    flaws, cwe_tree is a CWEIndex or the plain CWE tree. None of the arguments
+    is modified, so they can be reused for every tool.
+    With more than one job, the files are split between a pool of processes
+    and their partial counts are summed"""
+    if not isinstance(cwe_tree, cwe_index.CWEIndex):
+        cwe_tree = cwe_index.CWEIndex(cwe_tree)
+    if not isinstance(pot_flaws_dict, pot_flaws.PotFlawsIndex):
+        pot_flaws_dict = pot_flaws.PotFlawsIndex(pot_flaws_dict)
+
+    workers = scheduler.get_workers(jobs)
+    if workers == 1:
+        counts = confusion_counts(pot_flaws_dict, sast_flaws_dict, cwe, cwe_tree)
+        return get_metrics(**counts)
+
+    # Partition the files, each worker gets only the flaws of its files
+    filenames = sorted(set(sast_flaws_dict) | set(pot_flaws_dict.flaws_per_line))
+    partitions = [filenames[i::workers] for i in range(workers)]
+    counts = {"tp": 0, "fp": 0, "tn": 0, "fn": 0}
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_confusion_worker,
+        initargs=(cwe_tree,),
+    ) as executor:
+        futures = [
+            executor.submit(
+                confusion_counts_worker,
+                pot_flaws_dict.partition(partition),
+                {f: sast_flaws_dict[f] for f in partition if f in sast_flaws_dict},
+                cwe,
+            )
+            for partition in partitions
+        ]
+        for future in futures:
+            for name, count in future.result().items():
+                counts[name] += count
+
+    return get_metrics(**counts)
+
 
+def get_metrics(tp, fp, tn, fn):
     p = tp + fp
     n = tn + fn
 
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+import lib.output_parser as output_parser
+
+cache_dir = ".cache/sast"
+
+
+def hash_file(path, h=None):
+    """Hash the contents of the file, updating h if given"""
+    if h is None:
+        h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h
+
+
+def hash_directory(codedir):
+    """Hash the names and contents of every file in the directory"""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(codedir):
+        dirs.sort()
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            h.update(os.path.relpath(path, codedir).encode())
+            hash_file(path, h)
+    return h.hexdigest()
+
+
+def hash_parser():
+    """Hash the source of the output parser and the files it reads, to know
+    if cached results have to be filtered again"""
+    paths = [
+        os.path.join(os.path.dirname(__file__), "output_parser.py"),
+        os.path.join(os.path.dirname(__file__), "json_stream.py"),
+        output_parser.HORUSEC_RULES_FILE,
+    ]
+    h = hashlib.sha256()
+    for path in paths:
+        hash_file(path, h)
+    return h.hexdigest()
+
+
+def get_tool_version(tool):
+    command = f"{tool} version" if tool == "horusec" else f"{tool} --version"
+    try:
+        proc = subprocess.run(command, capture_output=True, shell=True, text=True)
+    except OSError:
+        return ""
+    return proc.stdout.strip()
+
+
+def get_key(tool, command, codedir, shard=None, format="json"):
+    """Get the cache key of a run from the suite contents, the command line
+    and the version of the tool"""
+    key = {
+        "tool": tool,
+        "command": command,
+        "version": get_tool_version(tool),
+        "codedir": hash_directory(codedir),
+        "shard": shard,
+    }
+    # keep the keys of the json runs as they were before the other formats
+    if format != "json":
+        key["format"] = format
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def get_entry_dir(key):
+    return f"{cache_dir}/{key}"
+
+
+def lookup(key):
+    """Return the metadata of the cached run, or None if not cached"""
+    meta_path = f"{get_entry_dir(key)}/meta.json"
+    if not os.path.isfile(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+
+def restore(key, outdir):
+    """Copy the cached outputs in the output directory"""
+    shutil.copytree(f"{get_entry_dir(key)}/out", outdir, dirs_exist_ok=True)
+
+
+def store(key, outdir, outputs, meta):
+    """Save the given outputs of outdir (files or directories) in the cache"""
+    entry_dir = get_entry_dir(key)
+    tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(f"{tmp_dir}/out")
+    for output in outputs:
+        src = f"{outdir}/{output}"
+        if os.path.isdir(src):
+            shutil.copytree(src, f"{tmp_dir}/out/{output}")
+        elif os.path.isfile(src):
+            shutil.copy2(src, f"{tmp_dir}/out/{output}")
+
+    meta["created"] = time.time()
+    meta["parser"] = hash_parser()
+    with open(f"{tmp_dir}/meta.json", "w") as f:
+        f.write(json.dumps(meta, indent=4))
+
+    # Replace atomically, other processes may be reading the same entry
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.rename(tmp_dir, entry_dir)
+
+
+def get_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            size += os.path.getsize(os.path.join(root, file))
+    return size
+
+
+def evict(max_size_gb=None, max_age_days=None):
+    """Remove the entries older than max_age_days, then the oldest entries
+    until the cache is smaller than max_size_gb"""
+    if not os.path.isdir(cache_dir):
+        return
+
+    entries = []
+    for key in os.listdir(cache_dir):
+        meta = lookup(key)
+        if meta is None:
+            continue
+        entries.append((meta["created"], key, get_size(get_entry_dir(key))))
+    entries.sort()
+
+    now = time.time()
+    total_size = sum(size for _, _, size in entries)
+    for created, key, size in entries:
+        too_old = max_age_days is not None and now - created > max_age_days * 86400
+        too_big = max_size_gb is not None and total_size > max_size_gb * (1024**3)
+        if not too_old and not too_big:
+            continue
+        shutil.rmtree(get_entry_dir(key), ignore_errors=True)
+        total_size -= size
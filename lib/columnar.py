@@ -0,0 +1,221 @@
+import numpy as np
+
+# lines are packed with the file id in a single int64 key: file_id * LINE_SPAN + line
+LINE_SPAN = 1 << 32
+
+
+class ColumnarEvaluator:
+    """Columnar version of benchmark.confusion_matrix, built once per language.
+    The potential flaws are kept in arrays sorted by file and method line, the
+    CWE relationships in a boolean matrix, and the SAST flaws are evaluated
+    with vectorized operations. The results are the same of confusion_matrix"""
+
+    def __init__(self, pot_flaws_dict, cwe_tree):
+        self.cwe_tree = cwe_tree
+        self.file_ids = {}
+        self.filenames = []
+        self.cwe_ids = {}
+        self.cwes = []
+        self.related = np.zeros((0, 0), dtype=bool)
+
+        files, lines, cwes, bad = [], [], [], []
+        for filename, flaws in pot_flaws_dict.items():
+            file_id = self.get_file_id(filename)
+            for flaw in flaws:
+                files.append(file_id)
+                lines.append(flaw["line"])
+                cwes.append(self.get_cwe_id(flaw["cwe"]))
+                bad.append(flaw["method"] != "good")
+
+        # sort by file and line, keeping the order of the flaws in the same method
+        files = np.array(files, dtype=np.int64)
+        lines = np.array(lines, dtype=np.int64)
+        order = np.lexsort((lines, files))
+        self.pot_file = files[order]
+        self.pot_key = self.pot_file * LINE_SPAN + lines[order]
+        self.pot_line = lines[order]
+        self.pot_cwe = np.array(cwes, dtype=np.int64)[order]
+        self.pot_bad = np.array(bad, dtype=bool)[order]
+        # position of each potential flaw among the flaws of the same method
+        self.pot_rank = np.arange(len(order)) - np.searchsorted(
+            self.pot_key, self.pot_key, side="left"
+        )
+
+    def get_file_id(self, filename):
+        if filename not in self.file_ids:
+            self.file_ids[filename] = len(self.filenames)
+            self.filenames.append(filename)
+        return self.file_ids[filename]
+
+    def get_cwe_id(self, cwe):
+        if cwe not in self.cwe_ids:
+            self.cwe_ids[cwe] = len(self.cwes)
+            self.cwes.append(cwe)
+        return self.cwe_ids[cwe]
+
+    def update_related(self):
+        """Extend the CWE relationship matrix with the new CWEs"""
+        old_num = self.related.shape[0]
+        num = len(self.cwes)
+        if old_num == num:
+            return
+        related = np.zeros((num, num), dtype=bool)
+        related[:old_num, :old_num] = self.related
+        for i in range(num):
+            for j in range(max(i, old_num), num):
+                related[i, j] = related[j, i] = self.cwe_tree.are_related(
+                    self.cwes[i], self.cwes[j]
+                )
+        self.related = related
+
+    def load_sast_flaws(self, sast_flaws_dict):
+        files, lines, cwes = [], [], []
+        for filename, found_list in sast_flaws_dict.items():
+            file_id = self.get_file_id(filename)
+            for sast_flaw in found_list:
+                files.append(file_id)
+                lines.append(sast_flaw["line"])
+                cwes.append(self.get_cwe_id(sast_flaw["cwe"]))
+        return (
+            np.array(files, dtype=np.int64),
+            np.array(lines, dtype=np.int64),
+            np.array(cwes, dtype=np.int64),
+        )
+
+    def load_sast_columns(self, columns):
+        """Load the SAST flaws from a filtered_store.FilteredColumns, without
+        building the dict of the filtered data"""
+        file_ids = np.array(
+            [self.get_file_id(filename) for filename in columns.files], dtype=np.int64
+        )
+        values, inverse = np.unique(
+            np.frombuffer(columns["cwe"], dtype=np.int32), return_inverse=True
+        )
+        cwe_ids = np.array(
+            [self.get_cwe_id(columns.decode_cwe(int(v))) for v in values],
+            dtype=np.int64,
+        )
+        return (
+            file_ids[np.frombuffer(columns["file"], dtype=np.uint32)],
+            np.frombuffer(columns["line"], dtype=np.int32).astype(np.int64),
+            cwe_ids[inverse.reshape(-1)],
+        )
+
+    def confusion_counts(self, sast_flaws_dict, cwe):
+        """Count TP, FP, TN and FN of the SAST flaws, given as the dict of the
+        filtered data or as filtered_store.FilteredColumns"""
+        if isinstance(sast_flaws_dict, dict):
+            files, lines, cwes = self.load_sast_flaws(sast_flaws_dict)
+        else:
+            files, lines, cwes = self.load_sast_columns(sast_flaws_dict)
+        self.update_related()
+
+        # method line: greatest potential flaw line of the file not after the line
+        keys = files * LINE_SPAN + lines
+        index = np.searchsorted(self.pot_key, keys, side="right") - 1
+        in_method = index >= 0
+        in_method[in_method] = self.pot_file[index[in_method]] == files[in_method]
+        # indexed only where valid, there may be no potential flaws at all
+        method_lines = lines.copy()
+        method_lines[in_method] = self.pot_line[index[in_method]]
+
+        # sort by file and method line, keeping the order of the SAST
+        order = np.lexsort((method_lines, files))
+        files, cwes = files[order], cwes[order]
+        keys = files * LINE_SPAN + method_lines[order]
+        num = len(keys)
+
+        # position of each SAST flaw in its method, and potential flaws there
+        group_start = np.searchsorted(keys, keys, side="left")
+        rank = np.arange(num) - group_start
+        pot_start = np.searchsorted(self.pot_key, keys, side="left")
+        pot_num = np.searchsorted(self.pot_key, keys, side="right") - pot_start
+
+        # the first SAST flaws of a method are matched one to one with the
+        # potential flaws of the method, in order
+        found = rank < pot_num
+        found_index = (pot_start + rank)[found]
+        tp_found = found.copy()
+        tp_found[found] = (
+            self.pot_bad[found_index]
+            & self.related[cwes[found], self.pot_cwe[found_index]]
+        )
+        tp = int(tp_found.sum())
+        fp = int((found & ~tp_found).sum())
+
+        # the first SAST flaw of a method without potential flaws is false
+        fp += int(((rank == 0) & (pot_num == 0)).sum())
+
+        # the other SAST flaws depend on the previous ones of the same method
+        tail = np.flatnonzero(~found & (rank > 0))
+        if len(tail) > 0:
+            # true positives found up to each SAST flaw in its file
+            tp_cum = np.cumsum(tp_found)
+            file_start = np.searchsorted(files, files, side="left")
+            tp_before_file = np.where(file_start > 0, tp_cum[file_start - 1], 0)
+            tp_in_file = tp_cum - tp_before_file
+            tail_tp, tail_fp = self.count_tail(
+                tail, files, cwes, group_start, pot_start, pot_num, tp_in_file
+            )
+            tp += tail_tp
+            fp += tail_fp
+
+        # potential flaws not matched by the SAST are negatives
+        group_keys, group_sizes = np.unique(keys, return_counts=True)
+        consumed = np.zeros(len(self.pot_key), dtype=np.int64)
+        if len(group_keys) > 0:
+            pos = np.searchsorted(group_keys, self.pot_key)
+            pos_valid = pos < len(group_keys)
+            matched = np.zeros(len(self.pot_key), dtype=bool)
+            matched[pos_valid] = group_keys[pos[pos_valid]] == self.pot_key[pos_valid]
+            consumed[matched] = group_sizes[pos[matched]]
+        not_found = self.pot_rank >= consumed
+        if cwe is not None:
+            file_cwe = np.array(
+                [filename.split("_")[0][3:] == cwe for filename in self.filenames],
+                dtype=bool,
+            )
+            not_found &= file_cwe[self.pot_file]
+        fn = int((not_found & self.pot_bad).sum())
+        tn = int((not_found & ~self.pot_bad).sum())
+
+        return {"tp": tp, "fp": fp, "tn": tn, "fn": fn}
+
+    def count_tail(
+        self, tail, files, cwes, group_start, pot_start, pot_num, tp_in_file
+    ):
+        """Evaluate in order the SAST flaws after the matched ones of their method,
+        that are ignored if related to the previous ones"""
+        # plain python values are faster than numpy scalars in the loop
+        related = [set(np.flatnonzero(row).tolist()) for row in self.related]
+        files = files.tolist()
+        cwes = cwes.tolist()
+        tp = 0
+        fp = 0
+        tail_tp_in_file = {}
+        last_group = -1
+        for i in tail.tolist():
+            start = int(group_start[i])
+            juliet_num = int(pot_num[i])
+            if start != last_group:
+                last_group = start
+                # the matched SAST flaws (or the first one) are the previous ones
+                last_cwes = set(cwes[start : start + max(juliet_num, 1)])
+                juliet_cwe = None
+                if juliet_num > 0:
+                    juliet_cwe = int(self.pot_cwe[pot_start[i] + juliet_num - 1])
+
+            file_id = files[i]
+            sast_related = related[cwes[i]]
+            related_to_last = not sast_related.isdisjoint(last_cwes)
+            tp_found_num = int(tp_in_file[i]) + tail_tp_in_file.get(file_id, 0)
+            if related_to_last and tp_found_num >= juliet_num:
+                continue
+            if juliet_cwe in sast_related:
+                # found but a previous record removed it
+                tp += 1
+                tail_tp_in_file[file_id] = tail_tp_in_file.get(file_id, 0) + 1
+            elif not related_to_last:
+                fp += 1
+            last_cwes.add(cwes[i])
+        return tp, fp
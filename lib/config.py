@@ -11,6 +11,25 @@ class Config:
     skip_cm = False
     skip_tests = False
     verbose = False
+    jobs = 1
+    min_free_mem = None
+    shard = None
+    shard_jobs = 1
+    use_cache = True
+    cache_max_size = 20
+    cache_max_age = 30
+    incremental = False
+    cm_jobs = 1
+    cm_backend = "python"
+    output_format = "json"
+    db = None
+    repeat = 1
+    warmup = 0
+    timeout = None
+    max_mem = None
+    max_files = None
+    trace = None
+    profile = None
 
     def __init__(self):
         # initialize argument parser and add options
@@ -32,16 +51,157 @@ class Config:
         )
         parser.add_argument("--skip-tests", help="Skip tests run", action="store_true")
         parser.add_argument("--verbose", help="Print SASTs output", action="store_true")
+        parser.add_argument(
+            "--jobs",
+            "-j",
+            help="Number of (tool, lang) pairs to run in parallel, 0 for one per CPU",
+            type=int,
+            default=1,
+        )
+        parser.add_argument(
+            "--min-free-mem",
+            help="Start a new parallel run only if this many GB of memory are free",
+            type=float,
+        )
+        parser.add_argument(
+            "--shard",
+            help="Split the test suite by CWE directory or by s01, s02, ... subfolder",
+            choices=["cwe", "sub"],
+        )
+        parser.add_argument(
+            "--shard-jobs",
+            help="Number of shards to run in parallel, 0 for one per CPU",
+            type=int,
+            default=1,
+        )
+        parser.add_argument(
+            "--no-cache",
+            help="Always run the tools, without using the results cache",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--cache-max-size",
+            help="Maximum size in GB of the results cache",
+            type=float,
+            default=20,
+        )
+        parser.add_argument(
+            "--cache-max-age",
+            help="Maximum age in days of the results in cache",
+            type=float,
+            default=30,
+        )
+        parser.add_argument(
+            "--incremental",
+            help="Run the tools only on the shards changed since their last run",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--cm-jobs",
+            help="Number of processes computing each confusion matrix, 0 for one per CPU",
+            type=int,
+            default=1,
+        )
+        parser.add_argument(
+            "--cm-backend",
+            help="Compute the confusion matrix in plain python or with numpy arrays",
+            choices=["python", "numpy"],
+            default="python",
+        )
+        parser.add_argument(
+            "--format",
+            help="Format of the filtered data files, columnar-zlib is compressed",
+            choices=["json", "columnar", "columnar-zlib"],
+            default="json",
+        )
+        parser.add_argument(
+            "--db",
+            help="SQLite database where the findings and the confusion matrices are saved",
+        )
+        parser.add_argument(
+            "--repeat",
+            help="Number of measured runs of each tool, to report timing statistics",
+            type=int,
+            default=1,
+        )
+        parser.add_argument(
+            "--warmup",
+            help="Number of runs of each tool before the measured ones",
+            type=int,
+            default=0,
+        )
+        parser.add_argument(
+            "--timeout",
+            help="Kill a tool (or a shard) running longer than this many seconds",
+            type=float,
+        )
+        parser.add_argument(
+            "--max-mem",
+            help="Kill a tool (or a shard) using more than this many GB of memory",
+            type=float,
+        )
+        parser.add_argument(
+            "--max-files",
+            help="Maximum number of files opened by each process of a tool",
+            type=int,
+        )
+        parser.add_argument(
+            "--trace",
+            help="Write the timed spans of every stage in a trace event file",
+            nargs="?",
+            const="out/trace.json",
+        )
+        parser.add_argument(
+            "--profile",
+            help="Write the cProfile stats of every stage in a directory, implies --trace",
+            nargs="?",
+            const="out/profile",
+        )
         args = parser.parse_args()
         self.tool = args.tool
         self.lang = args.lang
         self.skip_cm = args.skip_cm
         self.skip_tests = args.skip_tests
         self.verbose = args.verbose
+        self.jobs = args.jobs
+        self.min_free_mem = args.min_free_mem
+        self.shard = args.shard
+        self.shard_jobs = args.shard_jobs
+        self.use_cache = not args.no_cache
+        self.cache_max_size = args.cache_max_size
+        self.cache_max_age = args.cache_max_age
+        self.incremental = args.incremental
+        self.cm_jobs = args.cm_jobs
+        self.cm_backend = args.cm_backend
+        self.output_format = args.format
+        self.db = args.db
+        self.repeat = max(args.repeat, 1)
+        self.warmup = max(args.warmup, 0)
+        self.timeout = args.timeout
+        self.max_mem = args.max_mem
+        self.max_files = args.max_files
+        self.trace = args.trace
+        self.profile = args.profile
+        if self.profile is not None and self.trace is None:
+            self.trace = "out/trace.json"
 
         with open(self.CONFIG_FILE, "r") as f:
             self.config = json.load(f)
 
+    def get_limits(self, tool):
+        # Get the limits of the tool runs from config.json, the options given
+        # in the command line override them.
+        limits = dict(self.config.get("limits", {}).get(tool, {}))
+        options = {
+            "timeout": self.timeout,
+            "max_mem": self.max_mem,
+            "max_files": self.max_files,
+        }
+        for key, value in options.items():
+            if value is not None:
+                limits[key] = value
+        return limits
+
     def get_juliet_path(self, lang):
         # Get the path for the Juliet test suite based on the specified language.
         return self.config[f"juliet_{lang}_path"]
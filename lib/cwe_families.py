@@ -0,0 +1,157 @@
+# Families of CWEs, each one with its representative CWEs
+FAMILIES = {
+    "Authentication and access control": [
+        15,
+        247,
+        256,
+        259,
+        272,
+        284,
+        491,
+        500,
+        549,
+        560,
+        566,
+        582,
+        607,
+        613,
+        614,
+        620,
+        784,
+    ],
+    "Buffer handling": [121, 122, 123, 124, 126, 127, 242, 680, 785],
+    "Code Quality": [398, 477, 478, 484, 547, 561, 563, 570, 571, 585, 676],
+    "Control Flow Management": [
+        180,
+        364,
+        366,
+        367,
+        382,
+        383,
+        479,
+        483,
+        572,
+        584,
+        606,
+        609,
+        674,
+        698,
+        764,
+        764,
+        765,
+        832,
+        833,
+        835,
+    ],
+    "Encryption and Randomness": [
+        315,
+        319,
+        327,
+        328,
+        329,
+        330,
+        336,
+        338,
+        523,
+        759,
+        760,
+        780,
+    ],
+    "Error Handling": [248, 252, 253, 273, 390, 391, 392, 396, 397, 440, 617],
+    "File Handling": [23, 36, 377, 378, 379, 675],
+    "Information Leaks": [204, 209, 226, 244, 497, 499, 533, 534, 535, 591, 598, 615],
+    "Initialization and Shutdown": [
+        400,
+        401,
+        404,
+        415,
+        416,
+        457,
+        459,
+        568,
+        580,
+        586,
+        590,
+        665,
+        672,
+        761,
+        762,
+        772,
+        773,
+        775,
+        789,
+    ],
+    "Injection": [78, 80, 81, 83, 89, 90, 113, 129, 134, 436, 427, 470, 601, 643],
+    "Malicius Logic": [111, 114, 304, 321, 325, 506, 510, 511, 514, 546],
+    "Miscellaneous": [
+        188,
+        222,
+        223,
+        464,
+        475,
+        480,
+        481,
+        482,
+        486,
+        489,
+        579,
+        581,
+        597,
+        605,
+        666,
+        685,
+        688,
+        758,
+    ],
+    "Number Handling": [190, 191, 193, 194, 195, 196, 197, 369, 681],
+    "Pointer and Reference Handling": [
+        374,
+        395,
+        467,
+        468,
+        469,
+        476,
+        562,
+        587,
+        588,
+        690,
+        843,
+    ],
+}
+
+
+class FamilyIndex:
+    """Family of every CWE, resolved once with the closure of the CWE tree.
+    A CWE belongs to the first family with a CWE related to it, that is an
+    ancestor, a descendant or the CWE itself"""
+
+    def __init__(self, cwe_tree, families=FAMILIES):
+        self.families = families
+        descendants = {}
+        for cwe, ancestors in cwe_tree.ancestors.items():
+            for ancestor in ancestors:
+                descendants[ancestor] = descendants.get(ancestor, [])
+                descendants[ancestor].append(cwe)
+
+        # the earlier families overwrite the later ones
+        self.family = {}
+        for name, cwes in reversed(families.items()):
+            for cwe in map(str, cwes):
+                related = [cwe]
+                related.extend(cwe_tree.ancestors.get(cwe, ()))
+                related.extend(descendants.get(cwe, ()))
+                for related_cwe in related:
+                    self.family[related_cwe] = name
+
+    def classify(self, cwe):
+        """Return the family name of the CWE, or Unknown"""
+        return self.family.get(str(cwe), "Unknown")
+
+    def classify_all(self, cwes):
+        """Group the CWEs by family name, keeping their order"""
+        groups = {}
+        for cwe in cwes:
+            name = self.classify(cwe)
+            groups[name] = groups.get(name, [])
+            groups[name].append(cwe)
+        return groups
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+
+CWE_TREE_FILE = os.path.join(
+    os.path.dirname(__file__), "..", "util", "cwe_tree_full.json"
+)
+
+
+class CWEIndex:
+    """Transitive closure of the CWE tree, answers ancestor queries in O(1)"""
+
+    def __init__(self, tree, ancestors=None):
+        self.tree = tree
+        if ancestors is None:
+            ancestors = {cwe: self.compute_ancestors(cwe) for cwe in tree}
+        # map each CWE to the set of all its ancestors
+        self.ancestors = {cwe: frozenset(anc) for cwe, anc in ancestors.items()}
+
+    def compute_ancestors(self, cwe):
+        ancestors = set()
+        stack = list(self.tree.get(cwe, []))
+        while stack:
+            parent = stack.pop()
+            if parent in ancestors:
+                continue
+            ancestors.add(parent)
+            stack.extend(self.tree.get(parent, []))
+        return ancestors
+
+    def is_ancestor(self, cwe, ancestor):
+        """Returns true if the given ancestor is an ancestor of the given cwe
+        or the cwe and the ancestor are equal"""
+        return cwe == ancestor or ancestor in self.ancestors.get(cwe, ())
+
+    def are_related(self, first_cwe, second_cwe):
+        """Given two CWEs, return if one is an ancestor of the other one"""
+        return self.is_ancestor(first_cwe, second_cwe) or self.is_ancestor(
+            second_cwe, first_cwe
+        )
+
+
+def get_index_file(tree_file):
+    return f"{os.path.splitext(tree_file)[0]}_index.json"
+
+
+def load(tree_file=CWE_TREE_FILE):
+    """Load the index of the CWE tree, computing it and saving it next to the
+    tree if it doesn't exist or if the tree changed"""
+    with open(tree_file, "rb") as f:
+        tree_bytes = f.read()
+    tree_hash = hashlib.sha256(tree_bytes).hexdigest()
+    tree = json.loads(tree_bytes)
+
+    index_file = get_index_file(tree_file)
+    if os.path.isfile(index_file):
+        with open(index_file, "r") as f:
+            saved = json.load(f)
+        if saved["tree_hash"] == tree_hash:
+            return CWEIndex(tree, saved["ancestors"])
+
+    index = CWEIndex(tree)
+    ancestors = {cwe: sorted(anc) for cwe, anc in index.ancestors.items()}
+    with open(index_file, "w") as f:
+        f.write(
+            json.dumps(
+                {"tree_hash": tree_hash, "ancestors": ancestors},
+                indent=4,
+                sort_keys=True,
+            )
+        )
+    return index
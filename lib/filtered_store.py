@@ -0,0 +1,171 @@
+import array
+import json
+import mmap
+import struct
+import sys
+import zlib
+
+MAGIC = b"RISKFLT1"
+HEADER = struct.Struct("<8sI")
+ALIGN = 8
+
+# name and array typecode of the columns, one row per filtered flaw
+COLUMNS = [
+    ("file", "I"),
+    ("line", "i"),
+    ("cwe", "i"),
+    ("confidence", "I"),
+    ("severity", "I"),
+]
+
+
+def encode_cwe(cwe, strings):
+    """CWEs are stored as integers, the ones that are not plain numbers as
+    negative ids of the strings table"""
+    cwe = str(cwe)
+    if cwe.isdigit() and str(int(cwe)) == cwe and int(cwe) < 2**31:
+        return int(cwe)
+    return -strings.setdefault(cwe, len(strings)) - 1
+
+
+def write(path, filtered_data, compress=False):
+    """Write the filtered data in the columnar format. Filenames, confidences
+    and severities are interned in tables, CWEs are integers"""
+    files = {}
+    strings = {}
+    columns = {name: array.array(typecode) for name, typecode in COLUMNS}
+    for filename, flaws in filtered_data.items():
+        file_id = files.setdefault(filename, len(files))
+        for flaw in flaws:
+            columns["file"].append(file_id)
+            columns["line"].append(flaw["line"])
+            columns["cwe"].append(encode_cwe(flaw["cwe"], strings))
+            columns["confidence"].append(
+                strings.setdefault(flaw["confidence"], len(strings))
+            )
+            columns["severity"].append(
+                strings.setdefault(flaw["severity"], len(strings))
+            )
+
+    # columns are little endian and aligned, so they can be memory mapped
+    data = bytearray()
+    columns_info = []
+    for name, typecode in COLUMNS:
+        column = columns[name]
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns_info.append(
+            {
+                "name": name,
+                "typecode": typecode,
+                "offset": len(data),
+                "length": len(column),
+            }
+        )
+        data += column.tobytes()
+        data += b"\0" * (-len(data) % ALIGN)
+
+    header = json.dumps(
+        {
+            "count": len(columns["file"]),
+            "files": list(files),
+            "strings": list(strings),
+            "compression": "zlib" if compress else None,
+            "columns": columns_info,
+        }
+    ).encode()
+    header += b" " * (-(HEADER.size + len(header)) % ALIGN)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(header)))
+        f.write(header)
+        f.write(zlib.compress(bytes(data)) if compress else data)
+
+
+class FilteredColumns:
+    """Filtered data read from the columnar format. Uncompressed files are
+    memory mapped, and every column is an array-like memoryview"""
+
+    def __init__(self, path):
+        self.mm = None
+        with open(path, "rb") as f:
+            magic, header_len = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a filtered data file")
+            header = json.loads(f.read(header_len))
+            data_start = HEADER.size + header_len
+            if header["compression"] == "zlib":
+                data = memoryview(zlib.decompress(f.read()))
+            elif header["count"] > 0:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                data = memoryview(self.mm)[data_start:]
+            else:
+                data = memoryview(b"")
+
+        self.count = header["count"]
+        self.compression = header["compression"]
+        self.files = header["files"]
+        self.strings = header["strings"]
+        self.columns = {}
+        for column in header["columns"]:
+            itemsize = array.array(column["typecode"]).itemsize
+            start = column["offset"]
+            end = start + column["length"] * itemsize
+            values = data[start:end].cast(column["typecode"])
+            if sys.byteorder == "big":
+                values = array.array(column["typecode"], values)
+                values.byteswap()
+            self.columns[column["name"]] = values
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for values in self.columns.values():
+            if isinstance(values, memoryview):
+                values.release()
+        self.columns = {}
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def decode_cwe(self, value):
+        return str(value) if value >= 0 else self.strings[-value - 1]
+
+    def to_dict(self):
+        """Return the filtered data in the same format of the JSON files"""
+        filtered_data = {}
+        rows = zip(
+            self.columns["file"],
+            self.columns["line"],
+            self.columns["cwe"],
+            self.columns["confidence"],
+            self.columns["severity"],
+        )
+        for file_id, line, cwe, confidence, severity in rows:
+            filename = self.files[file_id]
+            filtered_data[filename] = filtered_data.get(filename, [])
+            filtered_data[filename].append(
+                {
+                    "cwe": self.decode_cwe(cwe),
+                    "line": line,
+                    "confidence": self.strings[confidence],
+                    "severity": self.strings[severity],
+                }
+            )
+        return filtered_data
+
+
+def read(path):
+    """Read the filtered data in the same format of the JSON files"""
+    with FilteredColumns(path) as columns:
+        return columns.to_dict()
@@ -0,0 +1,129 @@
+import json
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = " \t\n\r"
+
+
+class JSONStream:
+    """Incremental reader of a JSON file, that keeps in memory only the value
+    being decoded instead of the whole document"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def refill(self, size=CHUNK_SIZE):
+        chunk = self.f.read(size)
+        if chunk == "":
+            self.eof = True
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Skip the whitespaces and return the next char, or "" at the end"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos : self.pos + 1]
+            self.refill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} of the buffer")
+        self.pos += 1
+
+    def read_value(self):
+        """Decode the next value, reading more of the file until it's complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # double the buffer, so big values are decoded in linear time
+            self.refill(max(CHUNK_SIZE, len(self.buf) - self.pos))
+
+    def skip_value(self):
+        """Skip the next value, without decoding whole arrays or objects"""
+        char = self.peek()
+        if char == "[":
+            for _ in self.iter_array():
+                self.skip_value()
+        elif char == "{":
+            for _ in self.iter_object():
+                self.skip_value()
+        else:
+            self.read_value()
+
+    def iter_array(self):
+        """Iterate over an array, the caller has to consume each item"""
+        self.expect("[")
+        index = 0
+        while True:
+            if self.peek() == "]":
+                self.pos += 1
+                return
+            yield index
+            index += 1
+            if self.peek() == ",":
+                self.pos += 1
+
+    def iter_object(self):
+        """Iterate over the keys of an object, the caller has to consume
+        the value of each key"""
+        self.expect("{")
+        while True:
+            if self.peek() == "}":
+                self.pos += 1
+                return
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+
+    def goto(self, path):
+        """Move to the value at the given path of keys and indexes"""
+        for step in path:
+            if isinstance(step, int):
+                elements = self.iter_array()
+            else:
+                elements = self.iter_object()
+            for element in elements:
+                if element == step:
+                    break
+                self.skip_value()
+            else:
+                raise KeyError(step)
+
+
+def load_path(filename, path):
+    """Load only the value at the given path of the JSON file"""
+    with open(filename, "r") as f:
+        stream = JSONStream(f)
+        stream.goto(path)
+        return stream.read_value()
+
+
+def iter_items(filename, path):
+    """Iterate over the items of the array at the given path of the JSON file,
+    decoding one item at a time. A null value is an empty array"""
+    with open(filename, "r") as f:
+        stream = JSONStream(f)
+        stream.goto(path)
+        if stream.peek() != "[":
+            value = stream.read_value()
+            if value is None or value == "null":
+                return
+            raise ValueError(f"Expected an array at {path} in {filename}")
+        for _ in stream.iter_array():
+            yield stream.read_value()
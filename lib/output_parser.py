@@ -1,16 +1,27 @@
 import json
 import os
+import lib.json_stream as json_stream
+
+HORUSEC_RULES_FILE = os.path.join(
+    os.path.dirname(__file__), "..", "util", "horusec_rules.json"
+)
+# map of the horusec rules to their CWEs, see load_horusec_rules
+horusec_rules = None
 
 
 class FilteredData:
     def __init__(self):
         self.data = {}
+        # (filename, line, cwe) of every flaw, to find duplicates in O(1)
+        self.index = set()
 
     def add(self, path, cwe, line, confidence, severity):
-        if self.find(path=path, cwe=cwe, line=line):
+        filename = os.path.basename(path)
+        key = (filename, line, cwe)
+        if key in self.index:
             return
 
-        filename = os.path.basename(path)
+        self.index.add(key)
         self.data[filename] = self.data.get(filename, [])
         self.data[filename].append(
             {
@@ -22,41 +33,36 @@ class FilteredData:
         )
 
     def find(self, path, cwe, line):
-        filename = os.path.basename(path)
-        for elem in self.data.get(filename, []):
-            if elem["line"] == line and elem["cwe"] == cwe:
-                return True
-        return False
+        return (os.path.basename(path), line, cwe) in self.index
 
 
 def filter_semgrep_data(filename):
-    with open(filename, "r") as f:
-        data = json.load(f)
-        results = data["results"]
-        filtered_results = FilteredData()
-        for res in results:
-            path = res["path"]
-            if "CWE" not in path.split("/")[-1]:
-                continue
-            line = res["start"]["line"]
-            confidence = res["extra"]["metadata"]["confidence"]
-            severity = res["extra"]["metadata"]["impact"]
-            cwe_titles = res["extra"]["metadata"]["cwe"]
-            cwe_list = []
-            if type(cwe_titles) == list:
-                cwe_list = cwe_titles
-            else:
-                cwe_list = [cwe_titles]
-            for cwe in cwe_list:
-                cwe_code = (cwe.split(":")[0]).split("-")[1]
-                filtered_results.add(
-                    path=path,
-                    cwe=cwe_code,
-                    line=line,
-                    confidence=confidence,
-                    severity=severity,
-                )
-        return filtered_results.data
+    # Read the results one at a time, the report may be huge
+    results = json_stream.iter_items(filename, ["results"])
+    filtered_results = FilteredData()
+    for res in results:
+        path = res["path"]
+        if "CWE" not in path.split("/")[-1]:
+            continue
+        line = res["start"]["line"]
+        confidence = res["extra"]["metadata"]["confidence"]
+        severity = res["extra"]["metadata"]["impact"]
+        cwe_titles = res["extra"]["metadata"]["cwe"]
+        cwe_list = []
+        if type(cwe_titles) == list:
+            cwe_list = cwe_titles
+        else:
+            cwe_list = [cwe_titles]
+        for cwe in cwe_list:
+            cwe_code = (cwe.split(":")[0]).split("-")[1]
+            filtered_results.add(
+                path=path,
+                cwe=cwe_code,
+                line=line,
+                confidence=confidence,
+                severity=severity,
+            )
+    return filtered_results.data
 
 
 def filter_snyk_data(filename):
@@ -64,36 +70,60 @@ def filter_snyk_data(filename):
     if not os.path.isfile(filename):
         return FilteredData().data
 
-    with open(filename, "r") as f:
-        data = json.load(f)
-        run = data["runs"][0]
-        rules_cwes = {}  # map rule to list of CWEs
-        for r in run["tool"]["driver"]["rules"]:
-            rules_cwes[r["id"]] = [r["properties"]["cwe"][0]]
-        results = run["results"]
-        return filter_sarif_data(results, rules_cwes)
+    rules = json_stream.load_path(filename, ["runs", 0, "tool", "driver", "rules"])
+    rules_cwes = {}  # map rule to list of CWEs
+    for r in rules:
+        rules_cwes[r["id"]] = [r["properties"]["cwe"][0]]
+    results = json_stream.iter_items(filename, ["runs", 0, "results"])
+    return filter_sarif_data(results, rules_cwes)
 
 
 def filter_flawfinder_data(filename):
-    with open(filename, "r") as f:
-        data = json.load(f)
-        run = data["runs"][0]
-        rules = run["tool"]["driver"]["rules"]
-        rules_cwes = {}  # map rule to list of CWEs
-        for r in rules:
-            rules_cwes[r["id"]] = []
-            for relation in r["relationships"]:
-                cwe = relation["target"]["id"]
-                rules_cwes[r["id"]].append(cwe)
-        results = run["results"]
-        filtered = filter_sarif_data(results, rules_cwes)
-        # filter out the occurrences of 327 in main triggered by all the srand
-        for filename, flaw_list in filtered.items():
-            for flaw in reversed(flaw_list):
-                if flaw["cwe"] == "327":
-                    flaw_list.remove(flaw)
-                    break
-        return filtered
+    rules = json_stream.load_path(filename, ["runs", 0, "tool", "driver", "rules"])
+    results = json_stream.iter_items(filename, ["runs", 0, "results"])
+    filtered = filter_sarif_data(results, get_flawfinder_rules(rules))
+    return remove_srand_flaws(filtered)
+
+
+def filter_flawfinder_stream(f):
+    """Filter the flawfinder output read from f, that may be a TailFile, in a
+    single pass. The rules must come before the results, as flawfinder
+    writes them"""
+    stream = json_stream.JSONStream(f)
+    stream.goto(["runs", 0])
+    rules_cwes = None
+    filtered = {}
+    for key in stream.iter_object():
+        if key == "tool":
+            rules_cwes = get_flawfinder_rules(stream.read_value()["driver"]["rules"])
+        elif key == "results":
+            if rules_cwes is None:
+                raise ValueError("The results come before the rules")
+            results = (stream.read_value() for _ in stream.iter_array())
+            filtered = filter_sarif_data(results, rules_cwes)
+        else:
+            stream.skip_value()
+    return remove_srand_flaws(filtered)
+
+
+def get_flawfinder_rules(rules):
+    rules_cwes = {}  # map rule to list of CWEs
+    for r in rules:
+        rules_cwes[r["id"]] = []
+        for relation in r["relationships"]:
+            cwe = relation["target"]["id"]
+            rules_cwes[r["id"]].append(cwe)
+    return rules_cwes
+
+
+def remove_srand_flaws(filtered):
+    # filter out the occurrences of 327 in main triggered by all the srand
+    for filename, flaw_list in filtered.items():
+        for flaw in reversed(flaw_list):
+            if flaw["cwe"] == "327":
+                flaw_list.remove(flaw)
+                break
+    return filtered
 
 
 def filter_sarif_data(results, rules_cwes):
@@ -122,61 +152,74 @@ def filter_sarif_data(results, rules_cwes):
     return filtered_results.data
 
 
-def filter_horusec_data(filename):
-    rules = {}
-    with open("./util/horusec_rules.json", "r") as f:
-        rules = json.load(f)
-
-    with open(filename, "r") as f:
-        data = json.load(f)
-        filtered_results = FilteredData()
-        analysisVulnerabilities = data["analysisVulnerabilities"]
-        if analysisVulnerabilities is None or analysisVulnerabilities == "null":
-            analysisVulnerabilities = []
-
-        for vuln in analysisVulnerabilities:
-            vuln = vuln["vulnerabilities"]
-            line = vuln["line"]
-            path = vuln["file"]
-            if "CWE" not in path.split("/")[-1]:
-                continue
-            confidence = vuln["confidence"]
-            severity = vuln["severity"]
-            cwe_list = rules.get(vuln["rule_id"], [])
-            for cwe in cwe_list:
-                if cwe == "CWE-489":
-                    continue
+def load_horusec_rules():
+    """Load the CWEs of the horusec rules, only the first time"""
+    global horusec_rules
+    if horusec_rules is None:
+        with open(HORUSEC_RULES_FILE, "r") as f:
+            horusec_rules = json.load(f)
+    return horusec_rules
 
-                filtered_results.add(
-                    path=path,
-                    cwe=cwe.split("-")[1],
-                    line=int(line),
-                    confidence=confidence,
-                    severity=severity,
-                )
 
-        return filtered_results.data
+def filter_horusec_data(filename):
+    rules = load_horusec_rules()
 
+    filtered_results = FilteredData()
+    analysisVulnerabilities = json_stream.iter_items(
+        filename, ["analysisVulnerabilities"]
+    )
 
-def filter_cppcheck_data(filename):
-    with open(filename, "r") as f:
-        filtered_results = FilteredData()
-        for line in f.readlines():
-            [cwe, path, line, severity] = line.split(":")
-            if path[-2:] == ".h":
+    for vuln in analysisVulnerabilities:
+        vuln = vuln["vulnerabilities"]
+        line = vuln["line"]
+        path = vuln["file"]
+        if "CWE" not in path.split("/")[-1]:
+            continue
+        confidence = vuln["confidence"]
+        severity = vuln["severity"]
+        cwe_list = rules.get(vuln["rule_id"], [])
+        for cwe in cwe_list:
+            if cwe == "CWE-489":
                 continue
-            if "CWE" not in path.split("/")[-1]:
-                continue
-            confidence = ""
+
             filtered_results.add(
                 path=path,
-                cwe=cwe,
+                cwe=cwe.split("-")[1],
                 line=int(line),
                 confidence=confidence,
-                severity=severity[:-1],
+                severity=severity,
             )
 
-        return filtered_results.data
+    return filtered_results.data
+
+
+def filter_cppcheck_data(filename, partial=False):
+    with open(filename, "r") as f:
+        return filter_cppcheck_lines(f, partial)
+
+
+def filter_cppcheck_lines(lines, partial=False):
+    """Filter the lines of the cppcheck output, that may be a TailFile.
+    If partial, cppcheck was killed and the last line may be truncated"""
+    filtered_results = FilteredData()
+    for line in lines:
+        if partial and not line.endswith("\n"):
+            continue
+        [cwe, path, line, severity] = line.rstrip("\n").split(":")
+        if path[-2:] == ".h":
+            continue
+        if "CWE" not in path.split("/")[-1]:
+            continue
+        confidence = ""
+        filtered_results.add(
+            path=path,
+            cwe=cwe,
+            line=int(line),
+            confidence=confidence,
+            severity=severity,
+        )
+
+    return filtered_results.data
 
 
 def aggregate_cwe(data_to_aggregate):
@@ -224,3 +267,23 @@ def filter_data(tool, filename):
         case _:
             print("Tool not supported")
             exit()
+
+
+# parsers of the outputs written line by line, that can be filtered while
+# the tool is running
+stream_filters = {
+    "cppcheck": filter_cppcheck_lines,
+    "flawfinder": filter_flawfinder_stream,
+}
+
+
+def filter_partial_data(tool, filename):
+    """Filter the output of a tool that was killed before completing. The
+    output may be missing or truncated, in that case nothing is found"""
+    try:
+        if tool == "cppcheck":
+            return filter_cppcheck_data(filename, partial=True)
+        return filter_data(tool, filename)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Cannot read the partial output {filename}: {e}")
+        return FilteredData().data
@@ -0,0 +1,209 @@
+import bisect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import lib.scheduler as scheduler
+
+# per-file results of the extraction, keyed by path, modification time and size
+CACHE_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".cache",
+    "pot_flaws.json",
+)
+
+
+class PotFlawsIndex:
+    """Index of the Juliet potential flaws of a language, built once and
+    shared by the confusion matrices of every tool. It's never modified"""
+
+    def __init__(self, pot_flaws_dict):
+        # filename -> sorted method lines of the potential flaws
+        self.method_lines = {}
+        # filename -> method line -> potential flaws in that method, in order
+        self.flaws_per_line = {}
+        for filename, flaws in pot_flaws_dict.items():
+            per_line = {}
+            for flaw in flaws:
+                per_line[flaw["line"]] = per_line.get(flaw["line"], [])
+                per_line[flaw["line"]].append(flaw)
+            self.method_lines[filename] = sorted(flaw["line"] for flaw in flaws)
+            self.flaws_per_line[filename] = per_line
+
+    def get_method_line(self, filename, line):
+        """Given a filename and a line of a flaw, return the greatest method line
+        of the potential flaws not after the given line, or the line itself"""
+        lines = self.method_lines.get(filename, [])
+        index = bisect.bisect_right(lines, line)
+        return lines[index - 1] if index > 0 else line
+
+    def get_flaws(self, filename, method_line):
+        """Return the potential flaws of the file in the given method"""
+        return self.flaws_per_line.get(filename, {}).get(method_line, [])
+
+    def partition(self, filenames):
+        """Return the index restricted to the given files"""
+        index = PotFlawsIndex({})
+        for filename in filenames:
+            if filename in self.flaws_per_line:
+                index.method_lines[filename] = self.method_lines[filename]
+                index.flaws_per_line[filename] = self.flaws_per_line[filename]
+        return index
+
+
+def extract_cwe_number(filename):
+    # Split the filename by underscores
+    parts = filename.split("_")
+    for part in parts:
+        if part.startswith("CWE"):
+            # Extract the CWE number
+            cwe_number = part[3:]
+            return cwe_number
+    return None
+
+
+def scan_file(file_path, cwe_number):
+    """Return the potential flaws of a Juliet file, in order"""
+    flaws = []
+    with open(file_path, "r") as f:
+        # Read lines from the file
+        lines = f.readlines()
+    sink_decl = False
+    sink_call = False
+    for line in lines:
+        if "Sink(" in line:
+            if ";" in line:
+                sink_call = True
+            else:
+                sink_decl = True
+    # case, sink declaration, may have sink call
+    if sink_decl:
+        method_line = 0
+        # search and consider only sinks
+        is_in_bad_sink_method = False  # badSink, G2BSink
+        is_in_good_sink_method = False  # B2GSink
+        for line_num, line in enumerate(lines, start=1):
+            if "FLAW" in line or "FIX" in line:
+                if not is_in_bad_sink_method and not is_in_good_sink_method:
+                    continue
+                if is_in_good_sink_method:
+                    method = "good"
+                elif is_in_bad_sink_method:
+                    method = "bad"
+                flaws.append({"line": method_line, "cwe": cwe_number, "method": method})
+            elif ("badSink" in line or "G2BSink" in line) and ";" not in line:
+                is_in_bad_sink_method = True
+                method_line = line_num
+            elif ("B2GSink" in line) and ";" not in line:
+                is_in_good_sink_method = True
+                method_line = line_num
+            elif (
+                "G2B(" in line or "B2G(" in line or "good(" in line or "bad(" in line
+            ) and ";" not in line:
+                is_in_good_sink_method = False
+                is_in_bad_sink_method = False
+    # case no sink declaration, no sink call
+    elif not sink_call:
+        # base case
+        # Iterate through each line to find the string "POTENTIAL FLAW"
+        is_in_good_method = None
+        method_line = 0
+        for line_num, line in enumerate(lines, start=1):
+            if "FLAW" in line or "FIX" in line:
+                flaws.append(
+                    {
+                        "line": method_line,
+                        "cwe": cwe_number,
+                        "method": ("good" if is_in_good_method else "bad"),
+                    }
+                )
+            elif ("good" in line or "B2G" in line or "G2B" in line) and ";" not in line:
+                is_in_good_method = True
+                method_line = line_num
+            elif ("bad" in line) and ";" not in line:
+                is_in_good_method = False
+                method_line = line_num
+    return flaws
+
+
+def scan_files(files):
+    """Scan a batch of (path, cwe number), in a worker process"""
+    return [scan_file(file_path, cwe_number) for file_path, cwe_number in files]
+
+
+def load_cache(cache_file):
+    if not os.path.isfile(cache_file):
+        return {}
+    with open(cache_file, "r") as f:
+        return json.load(f)
+
+
+def save_cache(cache_file, cache):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_file, cache_file)
+
+
+def extract(juliet_directory, jobs=0, cache_file=CACHE_FILE, batch_size=256):
+    """Search the potential flaws of the Juliet files in the directory, using
+    `jobs` processes (0 for one per CPU). Return them by filename, in the
+    format of util/pot_flaws_{lang}.json.
+    The flaws of each file are cached by path, modification time and size,
+    so only the files changed since the last extraction are scanned"""
+    cache = load_cache(cache_file) if cache_file is not None else {}
+
+    # Files in the order of the walk, the flaws of files with the same name
+    # in different directories are merged in this order
+    files = []
+    for root, _, filenames in os.walk(juliet_directory):
+        for file in filenames:
+            cwe_number = extract_cwe_number(file)
+            if cwe_number is None:
+                continue
+            file_path = os.path.abspath(os.path.join(root, file))
+            stat = os.stat(file_path)
+            files.append((file_path, file, cwe_number, stat.st_mtime_ns, stat.st_size))
+
+    to_scan = []
+    for file_path, _, cwe_number, mtime, size in files:
+        entry = cache.get(file_path)
+        if entry is None or entry["mtime"] != mtime or entry["size"] != size:
+            to_scan.append((file_path, cwe_number))
+
+    batches = [to_scan[i : i + batch_size] for i in range(0, len(to_scan), batch_size)]
+    workers = min(scheduler.get_workers(jobs), max(len(batches), 1))
+    if workers == 1:
+        flaws_lists = [scan_files(batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            flaws_lists = list(executor.map(scan_files, batches))
+    scanned = {}
+    for batch, batch_flaws in zip(batches, flaws_lists):
+        for (file_path, _), flaws in zip(batch, batch_flaws):
+            scanned[file_path] = flaws
+
+    # Forget the files removed from the directory
+    prefix = os.path.join(os.path.abspath(juliet_directory), "")
+    paths = {file_path for file_path, *_ in files}
+    removed = [path for path in cache if path.startswith(prefix) and path not in paths]
+    for path in removed:
+        del cache[path]
+
+    results = {}
+    for file_path, file, _, mtime, size in files:
+        if file_path in scanned:
+            cache[file_path] = {
+                "mtime": mtime,
+                "size": size,
+                "flaws": scanned[file_path],
+            }
+        flaws = cache[file_path]["flaws"]
+        if len(flaws) > 0:
+            results[file] = results.get(file, [])
+            results[file].extend(flaws)
+
+    if cache_file is not None and (len(scanned) > 0 or len(removed) > 0):
+        save_cache(cache_file, cache)
+    print(f"Scanned {len(scanned)} of {len(files)} files")
+    return results
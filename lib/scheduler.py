@@ -0,0 +1,91 @@
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+def available_memory():
+    """Return the memory currently available on the machine in GB, or None
+    if it cannot be determined"""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / (1024 * 1024)
+    except OSError:
+        pass
+    try:
+        pages = os.sysconf("SC_AVPHYS_PAGES")
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024**3)
+    except (ValueError, OSError):
+        return None
+
+
+def process_group_memory(pgid):
+    """Return the resident memory in GB of the processes of a group, or None
+    if it cannot be determined"""
+    if not os.path.isdir("/proc"):
+        return None
+    rss_pages = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                # the fields after the command name, that may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[2]) == pgid:
+            rss_pages += int(fields[21])
+    return rss_pages * os.sysconf("SC_PAGE_SIZE") / (1024**3)
+
+
+def kill_process_group(pgid, grace_sec=5):
+    """Terminate the processes of a group, and kill the ones still running
+    after the grace period"""
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+        time_end = time.monotonic() + grace_sec
+        while time.monotonic() < time_end:
+            time.sleep(0.1)
+            # signal 0 only checks if the group still exists
+            os.killpg(pgid, 0)
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def get_workers(jobs):
+    """Return the number of workers to use, 0 means one per CPU"""
+    if jobs is None or jobs < 1:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def run_jobs(func, jobs_args, workers, min_free_mem=None):
+    """Run func(**args) for every args in jobs_args on a pool of processes.
+    At most `workers` jobs run at the same time, and a new job is started only
+    if at least `min_free_mem` GB of memory are available (one job is always
+    allowed to run). Jobs are started in the given order.
+    Yields (args, result) as soon as each job completes"""
+    pending = list(jobs_args)
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            # Start as many jobs as the CPU and memory budget allows
+            while pending and len(running) < workers:
+                if running and min_free_mem is not None:
+                    free_mem = available_memory()
+                    if free_mem is not None and free_mem < min_free_mem:
+                        break
+                args = pending.pop(0)
+                running[executor.submit(func, **args)] = args
+                # Let the tool allocate its memory before checking again
+                if pending and min_free_mem is not None:
+                    time.sleep(1)
+
+            done, _ = wait(running, timeout=5, return_when=FIRST_COMPLETED)
+            for future in done:
+                args = running.pop(future)
+                yield args, future.result()
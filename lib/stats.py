@@ -0,0 +1,31 @@
+import math
+import statistics
+
+# two-sided 95% critical values of the Student's t distribution, by degrees of freedom
+T_95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]  # fmt: skip
+Z_95 = 1.960
+
+
+def t_critical(dof):
+    return T_95[dof - 1] if dof <= len(T_95) else Z_95
+
+
+def summarize(samples):
+    """Return median, mean, standard deviation, min, max and the 95%
+    confidence interval of the mean of the samples"""
+    num = len(samples)
+    mean = statistics.fmean(samples)
+    stddev = statistics.stdev(samples) if num > 1 else 0.0
+    half_width = t_critical(num - 1) * stddev / math.sqrt(num) if num > 1 else 0.0
+    return {
+        "median": statistics.median(samples),
+        "mean": mean,
+        "stddev": stddev,
+        "min": min(samples),
+        "max": max(samples),
+        "ci95": [mean - half_width, mean + half_width],
+    }
@@ -0,0 +1,60 @@
+import time
+
+POLL_INTERVAL_SEC = 0.05
+CHUNK_SIZE = 1 << 16
+
+
+class TailFile:
+    """Reader of a file that another process is still writing. read() waits
+    for more data until is_done() is true, then returns "" at the end of the
+    file like a regular file. The file may not exist yet when it's opened"""
+
+    def __init__(self, path, is_done):
+        self.path = path
+        self.is_done = is_done
+        self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def wait_open(self):
+        while self.f is None:
+            # checked before opening, the file may be created meanwhile
+            done = self.is_done()
+            try:
+                self.f = open(self.path, "r")
+            except FileNotFoundError:
+                if done:
+                    raise
+                time.sleep(POLL_INTERVAL_SEC)
+
+    def read(self, size=-1):
+        self.wait_open()
+        while True:
+            done = self.is_done()
+            data = self.f.read(size)
+            if data or done:
+                return data
+            time.sleep(POLL_INTERVAL_SEC)
+
+    def __iter__(self):
+        """Yield the lines as soon as they are complete, the last one even
+        without a newline, like iterating over a regular file"""
+        pending = ""
+        while True:
+            data = self.read(CHUNK_SIZE)
+            if not data:
+                break
+            lines = (pending + data).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        if pending:
+            yield pending
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
@@ -0,0 +1,292 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import lib.scheduler as scheduler
+
+WATCHDOG_INTERVAL_SEC = 0.5
+PROGRESS_INTERVAL_SEC = 10
+# the outputs are read and logged in chunks, whatever the length of the lines
+CHUNK_SIZE = 64 * 1024
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+# time to read what is left in the pipes after the tool exits, a process
+# left in the background may keep them open
+READ_GRACE_SEC = 5
+# Set the soft limit of open files to $1, up to the hard limit, and run the
+# tool in the same process
+FILES_LIMIT_SCRIPT = (
+    'n=$1; shift; hard=$(ulimit -H -n); if [ "$hard" != unlimited ] && '
+    + '[ "$hard" -lt "$n" ]; then n=$hard; fi; ulimit -S -n "$n" && exec "$@"'
+)
+
+
+class RotatingLog:
+    """Log file renamed to {path}.1, {path}.2, ... when it reaches max_bytes,
+    only the last `backups` of them are kept"""
+
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.size = 0
+        # the total size, also of the rotated files
+        self.written = 0
+        self.file = open(path, "wb")
+
+    def write(self, data):
+        if self.size > 0 and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.size += len(data)
+        self.written += len(data)
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = open(self.path, "wb")
+        self.size = 0
+
+    def close(self):
+        self.file.close()
+
+
+class ToolProcess:
+    """A tool to run: its arguments, the file of its standard output if the
+    tool writes its report there, the log of its output and its limits (see
+    run). With echo, the output is also printed.
+    consumer(is_done) runs in a thread while the tool runs, is_done() tells
+    if the tool exited, and what it returns is saved in result"""
+
+    def __init__(
+        self,
+        name,
+        argv,
+        log_file,
+        stdout_file=None,
+        limits=None,
+        echo=False,
+        consumer=None,
+    ):
+        self.name = name
+        self.argv = argv
+        self.log_file = log_file
+        self.stdout_file = stdout_file
+        self.limits = limits or {}
+        self.echo = echo
+        self.consumer = consumer
+        self.result = None
+        self.log = None
+        self.time_start = None
+        self.time_end = None
+
+    def progress(self):
+        elapsed = time.perf_counter() - self.time_start
+        logged = self.log.written / (1024 * 1024) if self.log is not None else 0
+        return f"{self.name} {elapsed:.0f} s, log {logged:.1f} MB"
+
+
+def get_argv(process):
+    """Get the arguments starting the process. With limits["max_files"], a
+    shell sets the limit and then runs the tool, since a preexec_fn is not
+    safe with the threads of the event loop"""
+    max_files = process.limits.get("max_files")
+    if max_files is None:
+        return process.argv
+    return ["sh", "-c", FILES_LIMIT_SCRIPT, "sh", str(max_files)] + process.argv
+
+
+def get_usage(elapsed, rusage, partial):
+    # ru_maxrss is in kilobytes on linux, in bytes on macOS
+    max_rss = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return {
+        "time_sec": elapsed,
+        "user_sec": rusage.ru_utime,
+        "sys_sec": rusage.ru_stime,
+        "max_rss_mb": max_rss,
+        "read_blocks": rusage.ru_inblock,
+        "write_blocks": rusage.ru_oublock,
+        "vol_ctx_switches": rusage.ru_nvcsw,
+        "invol_ctx_switches": rusage.ru_nivcsw,
+        "partial": partial,
+    }
+
+
+async def read_stream(pipe, process, echo_stream):
+    """Copy the output of the process to its log as it arrives"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=CHUNK_SIZE)
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(pipe, "rb", 0)
+    )
+    try:
+        while True:
+            data = await reader.read(CHUNK_SIZE)
+            if not data:
+                return
+            process.log.write(data)
+            if process.echo:
+                echo_stream.buffer.write(data)
+                echo_stream.flush()
+    finally:
+        transport.close()
+
+
+async def watch(process, pid, executor, killed):
+    """Kill the process group when it exceeds the limits of the process"""
+    loop = asyncio.get_running_loop()
+    timeout = process.limits.get("timeout")
+    max_mem = process.limits.get("max_mem")
+    if timeout is None and max_mem is None:
+        return
+    while True:
+        await asyncio.sleep(WATCHDOG_INTERVAL_SEC)
+        if timeout is not None and time.perf_counter() - process.time_start > timeout:
+            killed.append(f"timeout of {timeout} seconds")
+        elif max_mem is not None:
+            mem = scheduler.process_group_memory(pid)
+            if mem is not None and mem > max_mem:
+                killed.append(f"memory limit of {max_mem} GB")
+        if killed:
+            await loop.run_in_executor(executor, scheduler.kill_process_group, pid)
+            return
+
+
+async def run_process(process, executor):
+    """Run the process in its own process group and wait for it with wait4,
+    to get the resources used by the process and by its children. Return the
+    exit code and the resource usage"""
+    loop = asyncio.get_running_loop()
+    process.log = RotatingLog(process.log_file)
+    stdout_read, stdout_write = None, None
+    if process.stdout_file is None:
+        stdout_read, stdout_write = os.pipe()
+    stderr_read, stderr_write = os.pipe()
+    stdout = open(process.stdout_file, "wb") if process.stdout_file else None
+    process.time_start = time.perf_counter()
+    try:
+        proc = subprocess.Popen(
+            get_argv(process),
+            stdin=subprocess.DEVNULL,
+            stdout=stdout if stdout is not None else stdout_write,
+            stderr=stderr_write,
+            start_new_session=True,
+        )
+    except OSError as e:
+        # like the shell when the command is not found
+        print(f"Cannot run {process.argv[0]}: {e}")
+        for fd in [stdout_read, stderr_read]:
+            if fd is not None:
+                os.close(fd)
+        process.log.close()
+        process.time_end = time.perf_counter()
+        elapsed = process.time_end - process.time_start
+        return 127, {"time_sec": elapsed, "partial": False}
+    finally:
+        # only the tool writes in the pipes now
+        if stdout_write is not None:
+            os.close(stdout_write)
+        os.close(stderr_write)
+        if stdout is not None:
+            stdout.close()
+
+    readers = [read_stream(stderr_read, process, sys.stderr)]
+    if stdout_read is not None:
+        readers.append(read_stream(stdout_read, process, sys.stdout))
+    readers = [asyncio.ensure_future(reader) for reader in readers]
+
+    done = threading.Event()
+    consumer = None
+    if process.consumer is not None:
+        consumer = loop.run_in_executor(executor, process.consumer, done.is_set)
+
+    killed = []
+    watchdog = asyncio.ensure_future(watch(process, proc.pid, executor, killed))
+    _, status, rusage = await loop.run_in_executor(executor, os.wait4, proc.pid, 0)
+    process.time_end = time.perf_counter()
+    done.set()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    watchdog.cancel()
+    if killed:
+        print(f"Killed '{' '.join(process.argv)}', it exceeded the {killed[0]}")
+    if killed or proc.returncode < 0:
+        # The processes left in the group would keep writing the outputs
+        await loop.run_in_executor(
+            executor, lambda: scheduler.kill_process_group(proc.pid, grace_sec=0)
+        )
+
+    _, pending = await asyncio.wait(readers, timeout=READ_GRACE_SEC)
+    for reader in pending:
+        reader.cancel()
+    process.log.close()
+    if consumer is not None:
+        process.result = await consumer
+
+    usage = get_usage(process.time_end - process.time_start, rusage, len(killed) > 0)
+    return proc.returncode, usage
+
+
+async def report_progress(running, counts):
+    """Print the processes running for a while, until cancelled"""
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL_SEC)
+        if not running:
+            continue
+        done, total = counts
+        print(
+            f"Running {len(running)} of {total} tool processes ({done} done): "
+            + ", ".join(process.progress() for process in running)
+        )
+
+
+async def run_all(processes, jobs, on_done):
+    semaphore = asyncio.Semaphore(jobs)
+    # the waits, the consumers and the kills of the processes run in threads
+    executor = ThreadPoolExecutor(max_workers=3 * jobs)
+    running = []
+    counts = [0, len(processes)]
+    results = [None] * len(processes)
+
+    async def run_one(i, process):
+        async with semaphore:
+            running.append(process)
+            try:
+                results[i] = await run_process(process, executor)
+            finally:
+                running.remove(process)
+            counts[0] += 1
+            if on_done is not None:
+                on_done(i, *results[i])
+
+    progress = asyncio.ensure_future(report_progress(running, counts))
+    try:
+        await asyncio.gather(
+            *(run_one(i, process) for i, process in enumerate(processes))
+        )
+    finally:
+        progress.cancel()
+        executor.shutdown(wait=False)
+    return results
+
+
+def run(processes, jobs=1, on_done=None):
+    """Run the tool processes from a single event loop, at most `jobs` at a
+    time, and return their (exit code, resource usage) in the same order.
+    The standard output and error of each tool are written to its rotating
+    log as they arrive, so the memory used doesn't depend on them. The
+    processes running for a while are printed every PROGRESS_INTERVAL_SEC.
+    A process group is killed if it runs longer than limits["timeout"]
+    seconds or uses more than limits["max_mem"] GB of memory, and then its
+    usage is marked as partial. limits["max_files"] is the maximum number of
+    open files of each process. A tool that cannot be started returns 127
+    and only its time in the usage.
+    on_done(index, exit code, usage) is called as soon as each process exits"""
+    jobs = max(1, min(scheduler.get_workers(jobs), len(processes)))
+    return asyncio.run(run_all(processes, jobs, on_done))
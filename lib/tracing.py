@@ -0,0 +1,180 @@
+import cProfile
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# The options are in the environment, so the worker processes inherit them
+TRACE_DIR_ENV = "SAST_TRACE_DIR"
+PROFILE_DIR_ENV = "SAST_PROFILE_DIR"
+
+# spans ended in this process and not yet written
+events = []
+events_lock = threading.Lock()
+# open spans and their profilers, in each thread
+local = threading.local()
+profile_count = 0
+owner_pid = os.getpid()
+
+
+def start(profile_dir=None):
+    """Enable the tracing in this process and in the ones started later,
+    and the profiling of each span if profile_dir is given"""
+    os.environ[TRACE_DIR_ENV] = tempfile.mkdtemp(prefix="sast_trace_")
+    if profile_dir is not None:
+        os.environ[PROFILE_DIR_ENV] = os.path.abspath(profile_dir)
+
+
+def is_enabled():
+    return TRACE_DIR_ENV in os.environ
+
+
+def now_us():
+    # perf_counter is the monotonic clock of the system, shared by the processes
+    return time.perf_counter_ns() // 1000
+
+
+@contextmanager
+def span(name, **args):
+    """Time the code in the block as a span with the given attributes. The
+    block can add attributes to the yielded dict, like the number of records"""
+    if not is_enabled():
+        yield args
+        return
+    reset_after_fork()
+    stack, profilers = get_thread_state()
+
+    profile_dir = os.environ.get(PROFILE_DIR_ENV)
+    # Only one profiler can be active at a time in some versions of python,
+    # the spans of the other threads are not profiled
+    if threading.current_thread() is not threading.main_thread():
+        profile_dir = None
+    if profile_dir is not None:
+        # The stats of a span don't include the nested spans
+        if profilers:
+            profilers[-1].disable()
+        profiler = cProfile.Profile()
+        profilers.append(profiler)
+        profiler.enable()
+
+    stack.append(name)
+    start_us = now_us()
+    try:
+        yield args
+    finally:
+        end_us = now_us()
+        stack.pop()
+        if profile_dir is not None:
+            profiler = profilers.pop()
+            profiler.disable()
+            dump_profile(profiler, profile_dir, name, args)
+            if profilers:
+                profilers[-1].enable()
+
+        add_event(name, start_us, end_us, args)
+        # Write the spans when the outermost one of a thread ends, a worker
+        # process may exit without running any handler
+        if not stack:
+            flush()
+
+
+def add_event(name, start_us, end_us, args):
+    event = {
+        "name": name,
+        "cat": "stage",
+        "ph": "X",
+        "ts": start_us,
+        "dur": end_us - start_us,
+        "pid": os.getpid(),
+        "tid": threading.get_native_id(),
+        "args": args,
+    }
+    with events_lock:
+        events.append(event)
+
+
+def record(name, time_start, time_end, **args):
+    """Record a span that already ended, from its perf_counter times, like
+    a tool process run by the event loop among the others"""
+    if not is_enabled():
+        return
+    reset_after_fork()
+    add_event(name, int(time_start * 1e6), int(time_end * 1e6), args)
+    stack, _ = get_thread_state()
+    if not stack:
+        flush()
+
+
+def get_thread_state():
+    """Return the open spans and their profilers in the current thread"""
+    if not hasattr(local, "stack"):
+        local.stack = []
+        local.profilers = []
+    return local.stack, local.profilers
+
+
+def reset_after_fork():
+    """A forked process inherits the open spans and the profiler of the
+    parent, forget them"""
+    global events, events_lock, local, owner_pid
+    if owner_pid == os.getpid():
+        return
+    _, profilers = get_thread_state()
+    for profiler in profilers:
+        profiler.disable()
+    events = []
+    events_lock = threading.Lock()
+    local = threading.local()
+    owner_pid = os.getpid()
+
+
+def dump_profile(profiler, profile_dir, name, args):
+    global profile_count
+    with events_lock:
+        profile_count += 1
+    labels = [name] + [
+        str(args[key]) for key in ["tool", "lang", "shard"] if key in args
+    ]
+    label = "_".join(labels).replace("/", "_")
+    os.makedirs(profile_dir, exist_ok=True)
+    profiler.dump_stats(
+        os.path.join(profile_dir, f"{label}_{os.getpid()}_{profile_count}.prof")
+    )
+
+
+def flush():
+    """Append the ended spans of this process to its file"""
+    global events
+    reset_after_fork()
+    with events_lock:
+        if not events:
+            return
+        trace_dir = os.environ[TRACE_DIR_ENV]
+        with open(os.path.join(trace_dir, f"{os.getpid()}.jsonl"), "a") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+        events = []
+
+
+def finish(trace_file):
+    """Merge the spans of every process in a trace event file, readable by
+    chrome://tracing, Perfetto and speedscope"""
+    if not is_enabled():
+        return
+    flush()
+    trace_dir = os.environ.pop(TRACE_DIR_ENV)
+    os.environ.pop(PROFILE_DIR_ENV, None)
+
+    trace_events = []
+    for part in sorted(os.listdir(trace_dir)):
+        with open(os.path.join(trace_dir, part), "r") as f:
+            trace_events.extend(json.loads(line) for line in f)
+    shutil.rmtree(trace_dir)
+    trace_events.sort(key=lambda event: event["ts"])
+
+    os.makedirs(os.path.dirname(trace_file) or ".", exist_ok=True)
+    with open(trace_file, "w") as f:
+        f.write(json.dumps({"traceEvents": trace_events, "displayTimeUnit": "ms"}))
@@ -0,0 +1,116 @@
+import json
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    args TEXT
+);
+CREATE TABLE IF NOT EXISTS tool_runs (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    tool TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    time_sec REAL,
+    PRIMARY KEY (run_id, tool, lang)
+);
+CREATE TABLE IF NOT EXISTS findings (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    tool TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    file TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    cwe TEXT NOT NULL,
+    severity TEXT,
+    confidence TEXT
+);
+CREATE INDEX IF NOT EXISTS findings_run ON findings (run_id, tool, lang);
+CREATE INDEX IF NOT EXISTS findings_cwe ON findings (cwe, tool, lang, run_id);
+CREATE INDEX IF NOT EXISTS findings_file ON findings (file, run_id);
+CREATE TABLE IF NOT EXISTS confusion (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    tool TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    tp INTEGER,
+    fp INTEGER,
+    tn INTEGER,
+    fn INTEGER,
+    accuracy REAL,
+    precision REAL,
+    recall REAL,
+    specificity REAL,
+    PRIMARY KEY (run_id, tool, lang)
+);
+"""
+
+
+def connect(path):
+    # parallel runs write in the same database, wait for the lock
+    conn = sqlite3.connect(path, timeout=120)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def start_run(path, args=None):
+    """Create a new run and return its id"""
+    with connect(path) as conn:
+        cur = conn.execute(
+            "INSERT INTO runs (started, args) VALUES (?, ?)",
+            (time.time(), json.dumps(args)),
+        )
+        run_id = cur.lastrowid
+    conn.close()
+    return run_id
+
+
+def record_findings(path, run_id, tool, lang, filtered_data, time_sec=None):
+    """Save the filtered data of a tool run, replacing the previous ones of the
+    same run"""
+    rows = (
+        (
+            run_id,
+            tool,
+            lang,
+            filename,
+            flaw["line"],
+            str(flaw["cwe"]),
+            flaw["severity"],
+            flaw["confidence"],
+        )
+        for filename, flaws in filtered_data.items()
+        for flaw in flaws
+    )
+    with connect(path) as conn:
+        conn.execute(
+            "DELETE FROM findings WHERE run_id = ? AND tool = ? AND lang = ?",
+            (run_id, tool, lang),
+        )
+        conn.executemany("INSERT INTO findings VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute(
+            "INSERT OR REPLACE INTO tool_runs VALUES (?, ?, ?, ?)",
+            (run_id, tool, lang, time_sec),
+        )
+    conn.close()
+
+
+def record_confusion(path, run_id, tool, lang, confmat):
+    with connect(path) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO confusion VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                run_id,
+                tool,
+                lang,
+                confmat["true positive"],
+                confmat["false positive"],
+                confmat["true negative"],
+                confmat["false negative"],
+                confmat["accuracy"],
+                confmat["precision"],
+                confmat["recall"],
+                confmat["specificity"],
+            ),
+        )
+    conn.close()
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+
+def local_name(tag):
+    """Return the tag without its namespace"""
+    return tag.rsplit("}", 1)[-1]
+
+
+class XMLStream:
+    """Event based reader of a XML file. Each element is removed from the
+    tree as soon as it ends, so the memory used doesn't depend on the size
+    of the file"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.elements = 0
+        self.time_start = None
+        self.time_end = None
+
+    def iter_start(self, tags):
+        """Yield (tag, attributes) at the start of every element with one of
+        the given tags, without namespace, in the order of the document"""
+        self.time_start = time.perf_counter()
+        stack = []
+        for event, elem in ET.iterparse(self.filename, events=("start", "end")):
+            if event == "start":
+                self.elements += 1
+                tag = local_name(elem.tag)
+                if tag in tags:
+                    yield tag, elem.attrib
+                stack.append(elem)
+                continue
+            stack.pop()
+            elem.clear()
+            # the parent has at most this child, removing it is O(1)
+            if stack:
+                stack[-1].remove(elem)
+        self.time_end = time.perf_counter()
+
+    def report(self, file=sys.stderr):
+        """Print the throughput of the parsing"""
+        elapsed = max(self.time_end - self.time_start, 1e-9)
+        size_mb = os.path.getsize(self.filename) / (1024 * 1024)
+        print(
+            f"Parsed {size_mb:.1f} MB and {self.elements} elements "
+            + f"in {elapsed:.2f} seconds ({size_mb / elapsed:.1f} MB/s, "
+            + f"{self.elements / elapsed:.0f} elements/s)",
+            file=file,
+        )
@@ -1,8 +1,17 @@
 import os
 import json
+import statistics
 import time
 import lib.config as configs
 import lib.benchmark as benchmark
+import lib.cache as cache
+import lib.cwe_index as cwe_index
+import lib.filtered_store as filtered_store
+import lib.pot_flaws as pot_flaws
+import lib.scheduler as scheduler
+import lib.stats as stats
+import lib.tracing as tracing
+import lib.warehouse as warehouse
 
 debug = False
 
@@ -16,7 +25,102 @@ all_tools = ["semgrep", "snyk", "horusec", "flawfinder", "cppcheck"]
 all_langs = ["java", "csharp", "cpp"]
 
 
-def run_tests(config, tools, langs):
+def load_times():
+    times = []
+    if os.path.exists("out/times.json"):
+        with open("out/times.json", "r") as f:
+            times = json.load(f)
+    return times
+
+
+def get_full_time(tm):
+    """Get the time of the last run of the record on the whole suite, an
+    incremental run may have run the tool only on a few shards"""
+    return tm.get("full_time_sec", tm["time_sec"])
+
+
+def get_median_usage(samples):
+    """Get the median of every field of the usages, over the samples that
+    have it: a tool that can't be started has only the time. The counters
+    stay integers, and the flags are true if true in any sample"""
+    usage = {}
+    keys = list(dict.fromkeys(key for sample in samples for key in sample))
+    for key in keys:
+        values = [sample[key] for sample in samples if key in sample]
+        if key in ["partial", "cached", "incremental"]:
+            usage[key] = any(values)
+        elif key.endswith("_sec") or key == "max_rss_mb":
+            usage[key] = statistics.median(values)
+        else:
+            usage[key] = round(statistics.median(values))
+    return usage
+
+
+def run_test(
+    tool,
+    lang,
+    codedir,
+    set_debug=False,
+    shard=None,
+    shard_jobs=1,
+    use_cache=False,
+    incremental=False,
+    output_format="json",
+    db=None,
+    run_id=None,
+    repeat=1,
+    warmup=0,
+    limits=None,
+):
+    # Create output directories
+    outdir = f"out/{lang}/{tool}"
+    os.makedirs(outdir, exist_ok=True)
+
+    # Run test, the warmup runs are not measured
+    samples = []
+    for i in range(warmup + repeat):
+        if i < warmup:
+            print(f"Warming up {tool} on {lang}, directory {codedir}")
+        else:
+            print(f"Running {tool} on {lang}, directory {codedir}")
+        with tracing.span(
+            "run_test", tool=tool, lang=lang, run=i, warmup=i < warmup
+        ) as span:
+            usage, filtered_data, _ = benchmark.run(
+                outdir=outdir,
+                tool=tool,
+                codedir=codedir,
+                set_debug=set_debug,
+                shard=shard,
+                shard_jobs=shard_jobs,
+                use_cache=use_cache,
+                incremental=incremental,
+                set_format=output_format,
+                set_limits=limits,
+            )
+            span["findings"] = benchmark.count_findings(filtered_data)
+        if i >= warmup:
+            samples.append(usage)
+
+    # The record has the median of every field, time_sec included, the
+    # statistics of the time and every sample
+    res = {"tool": tool, "lang": lang}
+    res.update(get_median_usage(samples))
+    res["timing"] = stats.summarize([sample["time_sec"] for sample in samples])
+    res["timing"]["warmup"] = warmup
+    res["samples"] = samples
+
+    if db is not None:
+        warehouse.record_findings(
+            db, run_id, tool, lang, filtered_data, res["time_sec"]
+        )
+    return res
+
+
+def run_tests(config, tools, langs, run_id=None):
+    # Remember the previous times to schedule the longest runs first
+    prev_times = {(tm["tool"], tm["lang"]): get_full_time(tm) for tm in load_times()}
+
     # If running on everything, ask to backup old directory
     if os.path.exists("out"):
         print(
@@ -35,30 +139,63 @@ def run_tests(config, tools, langs):
             print("Answer not expected")
             exit(1)
 
-    # Print results
-    results = []
+    # Repeated runs must really run the tools
+    use_cache = config.use_cache
+    incremental = config.incremental
+    if config.repeat > 1 or config.warmup > 0:
+        print("Repeating the runs, the cache and the incremental runs are disabled")
+        use_cache = False
+        incremental = False
+
+    # Every (tool, lang) pair is independent from the others
+    pairs = []
     for lang in langs:
         supported_tools = tool_support[lang]
         for tool in tools:
             if tool not in supported_tools:
                 continue
+            pairs.append(
+                {
+                    "tool": tool,
+                    "lang": lang,
+                    "codedir": f"{config.get_juliet_path(lang)}",
+                    "set_debug": debug,
+                    "shard": config.shard,
+                    "shard_jobs": config.shard_jobs,
+                    "use_cache": use_cache,
+                    "incremental": incremental,
+                    "output_format": config.output_format,
+                    "db": config.db,
+                    "run_id": run_id,
+                    "repeat": config.repeat,
+                    "warmup": config.warmup,
+                    "limits": config.get_limits(tool),
+                }
+            )
 
-            # Create output directories
-            outdir = f"out/{lang}/{tool}"
-            os.makedirs(outdir, exist_ok=True)
+    results = []
+    workers = scheduler.get_workers(config.jobs)
+    if workers == 1:
+        for pair in pairs:
+            results.append(run_test(**pair))
+    else:
+        pairs.sort(
+            key=lambda p: prev_times.get((p["tool"], p["lang"]), 0), reverse=True
+        )
+        print(f"Running {len(pairs)} tests with {workers} parallel jobs")
+        for pair, res in scheduler.run_jobs(
+            run_test, pairs, workers, min_free_mem=config.min_free_mem
+        ):
+            print(f"Done {pair['tool']} on {pair['lang']}")
+            results.append(res)
 
-            # Run test
-            codedir = f"{config.get_juliet_path(lang)}"
-            print(f"Running {tool} on {lang}, directory {codedir}")
-            elapsed_time, _, _ = benchmark.run(
-                outdir=outdir, tool=tool, codedir=codedir, set_debug=debug
-            )
-            results.append({"tool": tool, "lang": lang, "time_sec": elapsed_time})
+    if use_cache:
+        cache.evict(
+            max_size_gb=config.cache_max_size, max_age_days=config.cache_max_age
+        )
 
-    times = []
-    if os.path.exists("out/times.json"):
-        with open("out/times.json", "r") as f:
-            times = json.load(f)
+    # Only this process writes the times file, so there are no races
+    times = load_times()
 
     # Print and replace results
     print("\nRESULTS:")
@@ -67,32 +204,72 @@ def run_tests(config, tools, langs):
         lang = res["lang"]
         sec = res["time_sec"]
         print(f"{tool.capitalize()} on {lang} took {sec:.3f} seconds")
+        if res.get("partial"):
+            print("    killed before completing, the results are partial")
+        if res.get("incremental"):
+            print(
+                f"    incremental run, the tool ran on {res['shards_changed']} "
+                + f"of {res['shards_total']} shards"
+            )
+        if res.get("cached"):
+            print("    restored from cache, the time and usage are of the cached run")
+        if len(res["samples"]) > 1:
+            timing = res["timing"]
+            print(
+                f"    median of {len(res['samples'])} runs, "
+                + f"mean {timing['mean']:.3f} s, stddev {timing['stddev']:.3f} s, "
+                + f"min {timing['min']:.3f} s, max {timing['max']:.3f} s, "
+                + f"95% CI [{timing['ci95'][0]:.3f}, {timing['ci95'][1]:.3f}] s"
+            )
+        if "user_sec" in res:
+            print(
+                f"    CPU user {res['user_sec']:.3f} s, sys {res['sys_sec']:.3f} s, "
+                + f"peak RSS {res['max_rss_mb']:.1f} MB, "
+                + f"blocks read {res['read_blocks']}, written {res['write_blocks']}, "
+                + f"context switches {res['vol_ctx_switches']} voluntary, "
+                + f"{res['invol_ctx_switches']} involuntary"
+            )
         found = False
         for tm in times:
             if tool == tm["tool"] and lang == tm["lang"]:
                 found = True
-                tm["time_sec"] = sec
+                # Keep the time of the whole suite, to schedule the next runs
+                partial_suite = res.get("incremental") and (
+                    res["shards_changed"] < res["shards_total"]
+                )
+                if partial_suite:
+                    res["full_time_sec"] = get_full_time(tm)
+                # Replace the whole record, the old usage is not valid anymore
+                tm.clear()
+                tm.update(res)
         if not found:
             times.append(res)
 
+    os.makedirs("out", exist_ok=True)
     with open("out/times.json", "w") as f:
         f.write(json.dumps(times, indent=4))
 
 
-def create_confusion_matrix(config, tools, langs):
-    # Read the cwe tree from file
-    cwe_tree = {}
-    with open("util/cwe_tree_full.json", "r") as f:
-        cwe_tree = json.load(f)
+def create_confusion_matrix(config, tools, langs, run_id=None):
+    # Read the cwe tree index from file, or build it from the tree
+    cwe_tree = cwe_index.load("util/cwe_tree_full.json")
 
     for lang_dir in os.listdir("out"):
         if lang_dir not in langs:
             continue
 
-        # Open Juliet potential flaws file for current language
-        pot_flaws = {}
-        with open(f"util/pot_flaws_{lang_dir}.json", "r") as f:
-            pot_flaws = json.load(f)
+        # Open Juliet potential flaws file for current language and index it,
+        # the index is shared by every tool
+        with tracing.span("load_pot_flaws", lang=lang_dir):
+            with open(f"util/pot_flaws_{lang_dir}.json", "r") as f:
+                juliet_flaws = json.load(f)
+            if config.cm_backend == "numpy":
+                # numpy is needed only by this backend
+                import lib.columnar as columnar
+
+                evaluator = columnar.ColumnarEvaluator(juliet_flaws, cwe_tree)
+            else:
+                juliet_flaws = pot_flaws.PotFlawsIndex(juliet_flaws)
 
         # Get if we specified the CWE in the config.json file
         juliet_path = config.get_juliet_path(lang_dir)
@@ -106,25 +283,62 @@ def create_confusion_matrix(config, tools, langs):
             if tool_dir not in tools:
                 continue
 
-            for outfile in os.listdir(f"out/{lang_dir}/{tool_dir}"):
-                if "filtered" in outfile:
-                    # Open filtered file and build the confusion matrix
-                    filtered_data = {}
-                    with open(f"out/{lang_dir}/{tool_dir}/{outfile}", "r") as f:
-                        filtered_data = json.load(f)
+            filtered_file = benchmark.find_filtered_file(
+                f"out/{lang_dir}/{tool_dir}", tool_dir, format=config.output_format
+            )
+            if filtered_file is None:
+                continue
 
-                    # Compute confusion matrix and write to file in out dir
-                    print(f"Creating confusion matrix on {tool_dir} and {lang_dir}")
+            # Compute confusion matrix and write to file in out dir
+            print(f"Creating confusion matrix on {tool_dir} and {lang_dir}")
+            if config.cm_backend == "numpy" and filtered_file.endswith(".bin"):
+                # Read the columns directly, without building the filtered data
+                with filtered_store.FilteredColumns(filtered_file) as columns:
+                    with tracing.span(
+                        "confusion_matrix",
+                        tool=tool_dir,
+                        lang=lang_dir,
+                        backend="numpy",
+                        findings=len(columns),
+                    ):
+                        counts = evaluator.confusion_counts(columns, cwe)
+                confmat = benchmark.get_metrics(**counts)
+            elif config.cm_backend == "numpy":
+                filtered_data = benchmark.load_filtered(filtered_file)
+                with tracing.span(
+                    "confusion_matrix",
+                    tool=tool_dir,
+                    lang=lang_dir,
+                    backend="numpy",
+                    findings=benchmark.count_findings(filtered_data),
+                ):
+                    counts = evaluator.confusion_counts(filtered_data, cwe)
+                confmat = benchmark.get_metrics(**counts)
+            else:
+                filtered_data = benchmark.load_filtered(filtered_file)
+                with tracing.span(
+                    "confusion_matrix",
+                    tool=tool_dir,
+                    lang=lang_dir,
+                    backend="python",
+                    findings=benchmark.count_findings(filtered_data),
+                ):
                     confmat = benchmark.confusion_matrix(
-                        pot_flaws_dict=pot_flaws,
+                        pot_flaws_dict=juliet_flaws,
                         sast_flaws_dict=filtered_data,
                         cwe=cwe,
                         cwe_tree=cwe_tree,
+                        jobs=config.cm_jobs,
                     )
-                    with open(
-                        f"out/{lang_dir}/{tool_dir}/{tool_dir}_conf_mat.json", "w"
-                    ) as f:
-                        f.write(json.dumps(confmat, indent=4))
+            with tracing.span("write_confusion_matrix", tool=tool_dir, lang=lang_dir):
+                with open(
+                    f"out/{lang_dir}/{tool_dir}/{tool_dir}_conf_mat.json", "w"
+                ) as f:
+                    f.write(json.dumps(confmat, indent=4))
+            if config.db is not None:
+                warehouse.record_confusion(
+                    config.db, run_id, tool_dir, lang_dir, confmat
+                )
 
 
 def main():
@@ -145,18 +359,32 @@ def main():
 
     print(f"Specified tools {str(tools)} and languages {str(langs)}")
 
+    if config.trace is not None:
+        tracing.start(profile_dir=config.profile)
+
+    # Every invocation is a new run in the results database
+    run_id = None
+    if config.db is not None:
+        run_id = warehouse.start_run(config.db, {"tools": tools, "langs": langs})
+
     print()
     if not config.skip_tests:
-        run_tests(config, tools, langs)
+        with tracing.span("run_tests", tools=tools, langs=langs):
+            run_tests(config, tools, langs, run_id=run_id)
     else:
         print("Skipping tests")
 
     print()
     if not config.skip_cm:
-        create_confusion_matrix(config, tools, langs)
+        with tracing.span("create_confusion_matrix", tools=tools, langs=langs):
+            create_confusion_matrix(config, tools, langs, run_id=run_id)
     else:
         print("Skipping confusion matrix creation")
 
+    if config.trace is not None:
+        tracing.finish(config.trace)
+        print(f"Trace written to {config.trace}")
+
 
 if __name__ == "__main__":
     main()
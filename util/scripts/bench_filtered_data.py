@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import lib.output_parser as output_parser
+import generate_findings
+
+
+def bench(num):
+    """Add num findings to a FilteredData, return the time and the number of
+    findings kept. The findings are the ones of bench_pipeline.py, many of
+    them are duplicates"""
+    pot_flaws = generate_findings.generate_pot_flaws(
+        generate_findings.get_num_files(num)
+    )
+    findings = [
+        (f"/juliet/testcases/{filename}", line, cwe)
+        for filename, line, cwe in generate_findings.iter_findings(pot_flaws, num)
+    ]
+    filtered = output_parser.FilteredData()
+    time_start = time.perf_counter()
+    for path, line, cwe in findings:
+        filtered.add(path=path, cwe=cwe, line=line, confidence="", severity="error")
+    return time.perf_counter() - time_start, len(filtered.index)
+
+
+def main():
+    if len(sys.argv) > 2:
+        print("Usage: python3 bench_filtered_data.py [max_findings]")
+        sys.exit(1)
+
+    max_num = int(sys.argv[1]) if len(sys.argv) == 2 else 1_000_000
+    num = 10_000
+    while num <= max_num:
+        elapsed, kept = bench(num)
+        print(
+            f"{num:>10} findings ({kept} kept): {elapsed:.3f} s, "
+            + f"{elapsed / num * 1e9:.0f} ns/finding"
+        )
+        num *= 10
+
+
+if __name__ == "__main__":
+    main()
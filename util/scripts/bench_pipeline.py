@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.append(REPO_DIR)
+import lib.benchmark as benchmark
+import lib.cwe_index as cwe_index
+import lib.output_parser as output_parser
+import generate_findings
+
+# regressions are reported above this ratio with the compared results
+SLOWER_RATIO = 1.1
+
+
+def get_commit():
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return "unknown"
+    return proc.stdout.strip() or "unknown"
+
+
+def measure(func, repeat):
+    """Return the best time of func() over `repeat` runs, and its result"""
+    best = None
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        res = func()
+        elapsed = time.perf_counter() - time_start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, res
+
+
+def bench_size(num, repeat, cwe_tree):
+    """Benchmark the parsers and the evaluation on num synthetic findings"""
+    results = []
+
+    def add(name, elapsed, items):
+        ns_per_item = elapsed / max(items, 1) * 1e9
+        results.append(
+            {
+                "name": name,
+                "size": num,
+                "items": items,
+                "seconds": elapsed,
+                "ns_per_item": ns_per_item,
+            }
+        )
+        print(f"{name:>24} {num:>10}: {elapsed:.3f} s, {ns_per_item:.0f} ns/item")
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as tmpdir:
+        paths = generate_findings.generate(tmpdir, num)
+
+        parsers = [
+            ("filter_semgrep_data", output_parser.filter_semgrep_data, "semgrep"),
+            ("filter_snyk_data", output_parser.filter_snyk_data, "sarif"),
+            ("filter_flawfinder_data", output_parser.filter_flawfinder_data, "sarif"),
+            ("filter_horusec_data", output_parser.filter_horusec_data, "horusec"),
+            ("filter_cppcheck_data", output_parser.filter_cppcheck_data, "cppcheck"),
+        ]
+        filtered_data = None
+        for name, func, format in parsers:
+            elapsed, res = measure(lambda: func(paths[format]), repeat)
+            add(name, elapsed, num)
+            if format == "semgrep":
+                filtered_data = res
+
+        with open(paths["pot_flaws"], "r") as f:
+            pot_flaws = json.load(f)
+
+    findings = benchmark.count_findings(filtered_data)
+    elapsed, _ = measure(lambda: output_parser.aggregate_cwe(filtered_data), repeat)
+    add("aggregate_cwe", elapsed, findings)
+
+    # Pairs of CWEs of the tree, half of them related
+    rand = random.Random(0)
+    cwes = sorted(cwe_tree.tree)
+    pairs = []
+    for _ in range(num):
+        cwe = rand.choice(cwes)
+        ancestors = sorted(cwe_tree.ancestors[cwe])
+        if ancestors and rand.random() < 0.5:
+            pairs.append((cwe, rand.choice(ancestors)))
+        else:
+            pairs.append((cwe, rand.choice(cwes)))
+
+    def is_cwe_ancestor_pairs():
+        for cwe, ancestor in pairs:
+            benchmark.is_cwe_ancestor(cwe, ancestor, cwe_tree)
+
+    elapsed, _ = measure(is_cwe_ancestor_pairs, repeat)
+    add("is_cwe_ancestor", elapsed, len(pairs))
+
+    elapsed, _ = measure(
+        lambda: benchmark.confusion_matrix(pot_flaws, filtered_data, None, cwe_tree),
+        repeat,
+    )
+    add("confusion_matrix", elapsed, findings)
+    return results
+
+
+def compare(results, old_file):
+    """Print the ratio of the times with the results of a previous version"""
+    with open(old_file, "r") as f:
+        old = json.load(f)
+    old_seconds = {(res["name"], res["size"]): res["seconds"] for res in old["results"]}
+    print(f"\nCompared with {old['commit']}:")
+    for res in results:
+        key = (res["name"], res["size"])
+        if key not in old_seconds:
+            continue
+        ratio = res["seconds"] / max(old_seconds[key], 1e-9)
+        mark = " SLOWER" if ratio > SLOWER_RATIO else ""
+        print(f"{res['name']:>24} {res['size']:>10}: {ratio:.2f}x{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the output parsers and the confusion matrix"
+    )
+    parser.add_argument(
+        "--sizes",
+        help="Numbers of synthetic findings, up to 10000000",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000],
+    )
+    parser.add_argument(
+        "--repeat",
+        help="Runs of each benchmark, the best one counts",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "--output", help="JSON file of the results, by default bench_{commit}.json"
+    )
+    parser.add_argument("--compare", help="JSON file of the results of another version")
+    args = parser.parse_args()
+
+    commit = get_commit()
+    output = os.path.abspath(args.output or f"bench_{commit}.json")
+    old_file = os.path.abspath(args.compare) if args.compare is not None else None
+
+    cwe_tree = cwe_index.load()
+
+    results = []
+    for num in args.sizes:
+        results.extend(bench_size(num, args.repeat, cwe_tree))
+
+    with open(output, "w") as f:
+        f.write(
+            json.dumps(
+                {
+                    "commit": commit,
+                    "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpus": os.cpu_count(),
+                    "repeat": args.repeat,
+                    "results": results,
+                },
+                indent=4,
+            )
+        )
+    print(f"\nResults written to {output}")
+
+    if old_file is not None:
+        compare(results, old_file)
+
+
+if __name__ == "__main__":
+    main()
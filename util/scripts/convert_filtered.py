@@ -0,0 +1,53 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+import lib.benchmark as benchmark
+import lib.filtered_store as filtered_store
+
+formats = ["json", "columnar", "columnar-zlib"]
+
+
+def get_format(path):
+    """Get the format of a filtered data file, the columnar files are
+    compressed or not"""
+    if path.endswith(".json"):
+        return "json"
+    with filtered_store.FilteredColumns(path) as columns:
+        return "columnar-zlib" if columns.compression == "zlib" else "columnar"
+
+
+def convert(path, format):
+    """Convert a filtered data file to the given format, return the new path.
+    The file in the old format is removed"""
+    filtered_data = benchmark.load_filtered(path)
+    outdir = os.path.dirname(path)
+    tool = os.path.basename(path).split("_filtered")[0]
+    benchmark.output_format = format
+    benchmark.write_results(outdir, tool, filtered_data)
+    return benchmark.get_filtered_file(outdir, tool)
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[2] not in formats:
+        print(f"Usage: python3 convert_filtered.py path/to/out {{{','.join(formats)}}}")
+        sys.exit(1)
+
+    out_dir = sys.argv[1]
+    format = sys.argv[2]
+    for root, _, files in os.walk(out_dir):
+        for file in sorted(files):
+            if "_filtered." not in file:
+                continue
+            path = os.path.join(root, file)
+            if get_format(path) == format:
+                print(f"{path} is already in the {format} format")
+                continue
+            old_size = os.path.getsize(path)
+            new_path = convert(path, format)
+            new_size = os.path.getsize(new_path)
+            print(f"{path} ({old_size} B) -> {new_path} ({new_size} B)")
+
+
+if __name__ == "__main__":
+    main()
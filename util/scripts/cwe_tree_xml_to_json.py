@@ -1,30 +1,44 @@
+import os
 import sys
 import json
 
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+import lib.xml_stream as xml_stream
+
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 cwe_tree_xml_to_json.py path/to/cwe_tree.xml")
+    if len(sys.argv) not in [2, 3]:
+        print(
+            "Usage: python3 cwe_tree_xml_to_json.py path/to/cwe_tree.xml [cwe_tree_full.json]"
+        )
         sys.exit(1)
 
-    # the cwe tree file (XML file) given by the user
+    # the cwe tree file (XML file) given by the user, the full CWE catalog
+    # or the one filtered by filter_manifest_xml.py
     cwe_xml = sys.argv[1]
 
-    with open(cwe_xml, "r") as f:
-        cwe_tree = {}
-        child_cwe = ""
-        for line in f.readlines():
-            if "Weakness ID=" in line:
-                child_cwe = line.split('"')[1]
-            if 'Related_Weakness Nature="ChildOf"' in line:
-                parent_cwe = line.split('"')[3]
-                if cwe_tree.get(child_cwe) is None:
-                    cwe_tree[child_cwe] = [parent_cwe]
-                else:
-                    if parent_cwe not in cwe_tree[child_cwe]:
-                        cwe_tree[child_cwe].append(parent_cwe)
+    cwe_tree = {}
+    child_cwe = ""
+    stream = xml_stream.XMLStream(cwe_xml)
+    for tag, attrib in stream.iter_start({"Weakness", "Related_Weakness"}):
+        if tag == "Weakness":
+            child_cwe = attrib["ID"]
+            continue
+        if attrib.get("Nature") != "ChildOf":
+            continue
+        parent_cwe = attrib["CWE_ID"]
+        if cwe_tree.get(child_cwe) is None:
+            cwe_tree[child_cwe] = [parent_cwe]
+        else:
+            if parent_cwe not in cwe_tree[child_cwe]:
+                cwe_tree[child_cwe].append(parent_cwe)
 
+    if len(sys.argv) == 3:
+        with open(sys.argv[2], "w", encoding="UTF-8") as f:
+            f.write(json.dumps(cwe_tree, indent=4, sort_keys=True))
+    else:
         print(json.dumps(cwe_tree, indent=4, sort_keys=True))
+    stream.report()
 
 
 if __name__ == "__main__":
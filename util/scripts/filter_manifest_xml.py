@@ -1,26 +1,43 @@
+import os
 import sys
+from xml.sax.saxutils import XMLGenerator
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+import lib.xml_stream as xml_stream
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 filter_cwe_xml.py path/to/699.xml")
+    if len(sys.argv) not in [2, 3]:
+        print("Usage: python3 filter_cwe_xml.py path/to/699.xml [output.xml]")
         sys.exit(1)
 
     # the manifest file (XML file) given by the user
     cwe_xml = sys.argv[1]
-    print('<?xml version="1.0" encoding="UTF-8"?>')
-    with open(cwe_xml, "r") as f:
-        for line in f.readlines():
-            if "<Weakness_Or" in line or "</Weakness_Or" in line:
-                continue
-            if (
-                "<Weakness" in line
-                or "<Related_Weakness" in line
-                or "</Weakness" in line
-                or "</Related_W" in line
-            ):
-                # print to stdout
-                print(line, end="")
+    out = open(sys.argv[2], "w", encoding="UTF-8") if len(sys.argv) == 3 else sys.stdout
+
+    # keep only the weaknesses and their relationships, without namespace
+    writer = XMLGenerator(out, encoding="UTF-8", short_empty_elements=True)
+    writer.startDocument()
+    writer.startElement("Weaknesses", {})
+    in_weakness = False
+    stream = xml_stream.XMLStream(cwe_xml)
+    for tag, attrib in stream.iter_start({"Weakness", "Related_Weakness"}):
+        if tag == "Weakness":
+            if in_weakness:
+                writer.endElement("Weakness")
+            writer.startElement("Weakness", attrib)
+            in_weakness = True
+        else:
+            writer.startElement("Related_Weakness", attrib)
+            writer.endElement("Related_Weakness")
+    if in_weakness:
+        writer.endElement("Weakness")
+    writer.endElement("Weaknesses")
+    writer.endDocument()
+    out.write("\n")
+    if out is not sys.stdout:
+        out.close()
+    stream.report()
 
 
 if __name__ == "__main__":
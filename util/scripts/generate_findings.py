@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import random
+
+HORUSEC_RULES_FILE = os.path.join(os.path.dirname(__file__), "..", "horusec_rules.json")
+CWES = ["22", "78", "79", "89", "90", "190", "327", "369", "401", "415", "416"]
+CWES += ["476", "614", "643", "798"]
+SEVERITIES = ["LOW", "MEDIUM", "HIGH"]
+
+
+def get_num_files(num):
+    # about 20 findings per file, and at most as many files as Juliet
+    return min(max(num // 20, 100), 200_000)
+
+
+def generate_pot_flaws(num_files, seed=0):
+    """Generate the Juliet potential flaws of num_files files: a bad method
+    and one to three good methods in each file"""
+    rand = random.Random(seed)
+    pot_flaws = {}
+    for i in range(num_files):
+        cwe = rand.choice(CWES)
+        filename = f"CWE{cwe}_Synthetic__variant_{i // 100}_{i % 100:02d}.java"
+        line = rand.randint(20, 40)
+        flaws = [{"line": line, "cwe": cwe, "method": "bad"}]
+        for _ in range(rand.randint(1, 3)):
+            line += rand.randint(20, 60)
+            flaws.append({"line": line, "cwe": cwe, "method": "good"})
+        pot_flaws[filename] = flaws
+    return pot_flaws
+
+
+def iter_findings(pot_flaws, num, seed=0):
+    """Yield num findings (filename, line, cwe) on the files of pot_flaws.
+    About half are in a bad method with the right CWE, some in the good
+    methods, the others anywhere with a random CWE"""
+    rand = random.Random(seed)
+    filenames = list(pot_flaws)
+    for _ in range(num):
+        filename = rand.choice(filenames)
+        flaws = pot_flaws[filename]
+        kind = rand.random()
+        if kind < 0.5:
+            flaw = flaws[0]
+            yield filename, flaw["line"] + rand.randint(1, 15), flaw["cwe"]
+        elif kind < 0.7:
+            flaw = rand.choice(flaws)
+            yield filename, flaw["line"] + rand.randint(1, 15), flaw["cwe"]
+        else:
+            yield filename, rand.randint(1, 300), rand.choice(CWES)
+
+
+def write_array(f, items):
+    """Write the items of a JSON array one at a time"""
+    f.write("[\n")
+    first = True
+    for item in items:
+        if not first:
+            f.write(",\n")
+        f.write(json.dumps(item))
+        first = False
+    f.write("\n]")
+
+
+def write_semgrep(outfile, findings):
+    """Write a semgrep report of the findings (path, line, cwe)"""
+    results = (
+        {
+            "check_id": f"java.synthetic.rule-{cwe}",
+            "path": path,
+            "start": {"line": line, "col": 9},
+            "end": {"line": line, "col": 40},
+            "extra": {
+                "message": "synthetic finding",
+                "metadata": {
+                    "cwe": [f"CWE-{cwe}: Synthetic weakness"],
+                    "confidence": "MEDIUM",
+                    "impact": "HIGH",
+                },
+                "severity": "WARNING",
+            },
+        }
+        for path, line, cwe in findings
+    )
+    with open(outfile, "w") as f:
+        f.write('{"errors": [], "results": ')
+        write_array(f, results)
+        f.write(', "version": "1.0.0"}')
+
+
+def write_sarif(outfile, findings, cwes=CWES):
+    """Write a SARIF report of the findings (path, line, cwe), readable by
+    both the snyk and the flawfinder parsers, with one rule per CWE of cwes"""
+    rules = [
+        {
+            "id": f"rule-{cwe}",
+            "properties": {"cwe": [f"CWE-{cwe}"]},
+            "relationships": [{"target": {"id": f"CWE-{cwe}"}}],
+        }
+        for cwe in cwes
+    ]
+    results = (
+        {
+            "ruleId": f"rule-{cwe}",
+            "level": "warning",
+            "message": {"text": "synthetic finding"},
+            "locations": [
+                {
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": path},
+                        "region": {"startLine": line, "endLine": line},
+                    }
+                }
+            ],
+        }
+        for path, line, cwe in findings
+    )
+    with open(outfile, "w") as f:
+        f.write('{"version": "2.1.0", "runs": [{"tool": {"driver": ')
+        f.write(json.dumps({"name": "synthetic", "rules": rules}))
+        f.write('}, "results": ')
+        write_array(f, results)
+        f.write("}]}")
+
+
+def write_horusec(outfile, findings, seed=0):
+    """Write a horusec report of the findings (path, line, cwe), the CWEs
+    depend on the rules in util/horusec_rules.json"""
+    with open(HORUSEC_RULES_FILE, "r") as f:
+        horusec_rules = json.load(f)
+    rules_per_cwe = {}
+    for rule_id, cwes in horusec_rules.items():
+        for cwe in cwes:
+            cwe = cwe.split("-")[1]
+            rules_per_cwe[cwe] = rules_per_cwe.get(cwe, [])
+            rules_per_cwe[cwe].append(rule_id)
+    rule_ids = list(horusec_rules)
+
+    rand = random.Random(seed)
+    vulnerabilities = (
+        {
+            "vulnerabilities": {
+                "line": str(line),
+                "column": "9",
+                "confidence": rand.choice(SEVERITIES),
+                "file": path,
+                "severity": rand.choice(SEVERITIES),
+                "rule_id": rand.choice(rules_per_cwe.get(cwe, rule_ids)),
+            }
+        }
+        for path, line, cwe in findings
+    )
+    with open(outfile, "w") as f:
+        f.write(
+            '{"version": "v2.8.0", "status": "success", "analysisVulnerabilities": '
+        )
+        write_array(f, vulnerabilities)
+        f.write("}")
+
+
+def write_cppcheck(outfile, findings):
+    """Write a cppcheck report of the findings (path, line, cwe)"""
+    with open(outfile, "w") as f:
+        for path, line, cwe in findings:
+            f.write(f"{cwe}:{path}:{line}:error\n")
+
+
+def generate(outdir, num, seed=0):
+    """Write the pot flaws and the reports of every format with num findings
+    in outdir, return the paths by format"""
+    os.makedirs(outdir, exist_ok=True)
+    pot_flaws = generate_pot_flaws(get_num_files(num), seed=seed)
+    paths = {
+        "pot_flaws": os.path.join(outdir, "pot_flaws.json"),
+        "semgrep": os.path.join(outdir, "semgrep.json"),
+        "sarif": os.path.join(outdir, "sarif.json"),
+        "horusec": os.path.join(outdir, "horusec.json"),
+        "cppcheck": os.path.join(outdir, "cppcheck.txt"),
+    }
+    with open(paths["pot_flaws"], "w") as f:
+        f.write(json.dumps(pot_flaws))
+    # The same findings in every format, with the paths of each tool
+    findings = lambda prefix: (
+        (f"{prefix}/CWE{cwe}/s01/{filename}", line, cwe)
+        for filename, line, cwe in iter_findings(pot_flaws, num, seed)
+    )
+    write_semgrep(paths["semgrep"], findings("/juliet/src/testcases"))
+    write_sarif(paths["sarif"], findings("src/testcases"))
+    write_horusec(paths["horusec"], findings("src/testcases"), seed)
+    write_cppcheck(paths["cppcheck"], findings("/juliet/testcases"))
+    return paths
+
+
+def main():
+    if len(sys.argv) not in [3, 4]:
+        print("Usage: python3 generate_findings.py path/to/outdir num_findings [seed]")
+        sys.exit(1)
+
+    seed = int(sys.argv[3]) if len(sys.argv) == 4 else 0
+    paths = generate(sys.argv[1], int(sys.argv[2]), seed=seed)
+    for path in paths.values():
+        print(f"{path} ({os.path.getsize(path)} B)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,686 @@
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+import lib.pot_flaws as pot_flaws
+import lib.scheduler as scheduler
+
+# CWE number and directory name of the generated test cases
+CWES = [
+    ("78", "OS_Command_Injection"),
+    ("89", "SQL_Injection"),
+    ("190", "Integer_Overflow"),
+    ("191", "Integer_Underflow"),
+    ("369", "Divide_by_Zero"),
+    ("400", "Resource_Exhaustion"),
+    ("476", "NULL_Pointer_Dereference"),
+    ("606", "Unchecked_Loop_Condition"),
+    ("681", "Incorrect_Conversion_Between_Numeric_Types"),
+    ("789", "Uncontrolled_Mem_Alloc"),
+]
+EXTENSIONS = {"java": "java", "csharp": "cs", "cpp": "cpp"}
+# one test case in SINK_EVERY is split in a file with the sources and one with the sinks
+SINK_EVERY = 3
+SUB_SIZE = 1000
+
+
+class TestCaseWriter:
+    """Lines of a test case file and its potential flaws, in the format of
+    search_juliet_pot_flaws.py. A potential flaw is the FLAW or FIX marker
+    of a method recognized by the search: its line is the one of the method,
+    and its method is bad or good depending on the method name"""
+
+    def __init__(self, cwe, method="bad", method_line=0):
+        self.cwe = cwe
+        self.lines = []
+        self.flaws = []
+        # the search counts markers outside of the methods it recognizes
+        # as bad at line 0, or skips them in the files with sinks (None)
+        self.method = method
+        self.method_line = method_line
+
+    def add(self, *lines):
+        self.lines.extend(lines)
+
+    def method_start(self, line, method):
+        self.lines.append(line)
+        self.method = method
+        self.method_line = len(self.lines)
+
+    def marker(self, line):
+        self.lines.append(line)
+        if self.method is not None:
+            self.flaws.append(
+                {"line": self.method_line, "cwe": self.cwe, "method": self.method}
+            )
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def add_header(writer, filename, dirname, cwe, template):
+    writer.add(
+        "/* TEMPLATE GENERATED TESTCASE FILE",
+        f"Filename: {filename}",
+        f"Label Definition File: {dirname}.label.xml",
+        f"Template File: {template}",
+        "*/",
+        "/*",
+        " * @description",
+        f" * CWE: {cwe} {dirname.split('_', 1)[1].replace('_', ' ')}",
+        " * Flow Variant: synthetic",
+        " * */",
+        "",
+    )
+
+
+def java_simple(name, dirname, cwe):
+    writer = TestCaseWriter(cwe)
+    add_header(writer, f"{name}.java", dirname, cwe, "sources-sink-01.tmpl.java")
+    writer.add(
+        f"package testcases.{dirname};",
+        "",
+        "import testcasesupport.*;",
+        "",
+        f"public class {name} extends AbstractTestCase",
+        "{",
+    )
+    writer.method_start("    public void bad() throws Throwable", "bad")
+    writer.add("    {", "        int data;", "")
+    writer.marker("        /* POTENTIAL FLAW: Read data from the environment */")
+    writer.add(
+        '        data = IO.getenvInt("ADD");',
+        "",
+        '        IO.writeLine("" + (data + 1));',
+        "    }",
+        "",
+    )
+    writer.method_start("    public void good() throws Throwable", "good")
+    writer.add("    {", "        goodG2B();", "        goodB2G();", "    }", "")
+    writer.method_start("    private void goodG2B() throws Throwable", "good")
+    writer.add("    {", "        int data;", "")
+    writer.marker("        /* FIX: Use a hardcoded number */")
+    writer.add(
+        "        data = 2;",
+        "",
+        '        IO.writeLine("" + (data + 1));',
+        "    }",
+        "",
+    )
+    writer.method_start("    private void goodB2G() throws Throwable", "good")
+    writer.add("    {", "        int data;", "")
+    writer.marker("        /* POTENTIAL FLAW: Read data from the environment */")
+    writer.add('        data = IO.getenvInt("ADD");', "")
+    writer.marker("        /* FIX: Check the value before using it */")
+    writer.add(
+        "        if (data < Integer.MAX_VALUE)",
+        "        {",
+        '            IO.writeLine("" + (data + 1));',
+        "        }",
+        "    }",
+        "",
+        "    public static void main(String[] args) throws ClassNotFoundException,",
+        "           InstantiationException, IllegalAccessException",
+        "    {",
+        "        mainFromParent(args);",
+        "    }",
+        "}",
+    )
+    return writer
+
+
+def java_sources(name, dirname, cwe, sinks_name):
+    # the sinks are called, the search ignores the whole file
+    writer = TestCaseWriter(cwe, method=None)
+    add_header(writer, f"{name}.java", dirname, cwe, "sources-sinks-51a.tmpl.java")
+    writer.add(
+        f"package testcases.{dirname};",
+        "",
+        "import testcasesupport.*;",
+        "",
+        f"public class {name} extends AbstractTestCase",
+        "{",
+        "    public void bad() throws Throwable",
+        "    {",
+        "        int data;",
+        "        /* POTENTIAL FLAW: Read data from the environment */",
+        '        data = IO.getenvInt("ADD");',
+        f"        (new {sinks_name}()).badSink(data);",
+        "    }",
+        "",
+        "    public void good() throws Throwable",
+        "    {",
+        "        goodG2B();",
+        "        goodB2G();",
+        "    }",
+        "",
+        "    private void goodG2B() throws Throwable",
+        "    {",
+        "        int data;",
+        "        /* FIX: Use a hardcoded number */",
+        "        data = 2;",
+        f"        (new {sinks_name}()).goodG2BSink(data);",
+        "    }",
+        "",
+        "    private void goodB2G() throws Throwable",
+        "    {",
+        "        int data;",
+        "        /* POTENTIAL FLAW: Read data from the environment */",
+        '        data = IO.getenvInt("ADD");',
+        f"        (new {sinks_name}()).goodB2GSink(data);",
+        "    }",
+        "",
+        "    public static void main(String[] args) throws ClassNotFoundException,",
+        "           InstantiationException, IllegalAccessException",
+        "    {",
+        "        mainFromParent(args);",
+        "    }",
+        "}",
+    )
+    return writer
+
+
+def java_sinks(name, dirname, cwe):
+    writer = TestCaseWriter(cwe, method=None)
+    add_header(writer, f"{name}.java", dirname, cwe, "sources-sinks-51b.tmpl.java")
+    writer.add(
+        f"package testcases.{dirname};",
+        "",
+        "import testcasesupport.*;",
+        "",
+        f"public class {name}",
+        "{",
+    )
+    writer.method_start("    public void badSink(int data) throws Throwable", "bad")
+    writer.add("    {")
+    writer.marker("        /* POTENTIAL FLAW: Use the data without checking it */")
+    writer.add('        IO.writeLine("" + (data + 1));', "    }", "")
+    # the search counts the sink of the good source as bad
+    writer.method_start("    public void goodG2BSink(int data) throws Throwable", "bad")
+    writer.add("    {")
+    writer.marker("        /* POTENTIAL FLAW: Use the data without checking it */")
+    writer.add('        IO.writeLine("" + (data + 1));', "    }", "")
+    writer.method_start(
+        "    public void goodB2GSink(int data) throws Throwable", "good"
+    )
+    writer.add("    {")
+    writer.marker("        /* FIX: Check the value before using it */")
+    writer.add(
+        "        if (data < Integer.MAX_VALUE)",
+        "        {",
+        '            IO.writeLine("" + (data + 1));',
+        "        }",
+        "    }",
+        "}",
+    )
+    return writer
+
+
+def csharp_simple(name, dirname, cwe):
+    # Bad() and Good() are capitalized like in Juliet, the search doesn't
+    # recognize them: the markers of Bad() are bad at line 0
+    writer = TestCaseWriter(cwe)
+    add_header(writer, f"{name}.cs", dirname, cwe, "sources-sink-01.tmpl.cs")
+    writer.add(
+        "using TestCaseSupport;",
+        "using System;",
+        "",
+        f"namespace testcases.{dirname}",
+        "{",
+        f"class {name} : AbstractTestCase",
+        "{",
+        "#if (!OMITBAD)",
+        "    public override void Bad()",
+        "    {",
+        "        int data;",
+    )
+    writer.marker("        /* POTENTIAL FLAW: Read data from the console */")
+    writer.add(
+        "        data = int.Parse(Console.ReadLine());",
+        '        IO.WriteLine("" + (data + 1));',
+        "    }",
+        "#endif",
+        "",
+        "#if (!OMITGOOD)",
+        "    public override void Good()",
+        "    {",
+        "        GoodG2B();",
+        "        GoodB2G();",
+        "    }",
+        "",
+    )
+    writer.method_start("    private void GoodG2B()", "good")
+    writer.add("    {", "        int data;")
+    writer.marker("        /* FIX: Use a hardcoded number */")
+    writer.add(
+        "        data = 2;", '        IO.WriteLine("" + (data + 1));', "    }", ""
+    )
+    writer.method_start("    private void GoodB2G()", "good")
+    writer.add("    {", "        int data;")
+    writer.marker("        /* POTENTIAL FLAW: Read data from the console */")
+    writer.add("        data = int.Parse(Console.ReadLine());")
+    writer.marker("        /* FIX: Check the value before using it */")
+    writer.add(
+        "        if (data < int.MaxValue)",
+        "        {",
+        '            IO.WriteLine("" + (data + 1));',
+        "        }",
+        "    }",
+        "#endif",
+        "",
+        "    public static void Main(string[] args)",
+        "    {",
+        f"        TestCaseMain(typeof({name}));",
+        "    }",
+        "}",
+        "}",
+    )
+    return writer
+
+
+def csharp_sources(name, dirname, cwe, sinks_name):
+    # the sinks are called, the search ignores the whole file
+    writer = TestCaseWriter(cwe, method=None)
+    add_header(writer, f"{name}.cs", dirname, cwe, "sources-sinks-51a.tmpl.cs")
+    writer.add(
+        "using TestCaseSupport;",
+        "using System;",
+        "",
+        f"namespace testcases.{dirname}",
+        "{",
+        f"class {name} : AbstractTestCase",
+        "{",
+        "#if (!OMITBAD)",
+        "    public override void Bad()",
+        "    {",
+        "        int data;",
+        "        /* POTENTIAL FLAW: Read data from the console */",
+        "        data = int.Parse(Console.ReadLine());",
+        f"        {sinks_name}.BadSink(data);",
+        "    }",
+        "#endif",
+        "",
+        "#if (!OMITGOOD)",
+        "    public override void Good()",
+        "    {",
+        "        GoodG2B();",
+        "        GoodB2G();",
+        "    }",
+        "",
+        "    private void GoodG2B()",
+        "    {",
+        "        int data;",
+        "        /* FIX: Use a hardcoded number */",
+        "        data = 2;",
+        f"        {sinks_name}.GoodG2BSink(data);",
+        "    }",
+        "",
+        "    private void GoodB2G()",
+        "    {",
+        "        int data;",
+        "        /* POTENTIAL FLAW: Read data from the console */",
+        "        data = int.Parse(Console.ReadLine());",
+        f"        {sinks_name}.GoodB2GSink(data);",
+        "    }",
+        "#endif",
+        "}",
+        "}",
+    )
+    return writer
+
+
+def csharp_sinks(name, dirname, cwe):
+    # BadSink() is capitalized like in Juliet, the search skips its markers
+    writer = TestCaseWriter(cwe, method=None)
+    add_header(writer, f"{name}.cs", dirname, cwe, "sources-sinks-51b.tmpl.cs")
+    writer.add(
+        "using TestCaseSupport;",
+        "using System;",
+        "",
+        f"namespace testcases.{dirname}",
+        "{",
+        f"class {name}",
+        "{",
+        "#if (!OMITBAD)",
+        "    public static void BadSink(int data)",
+        "    {",
+    )
+    writer.marker("        /* POTENTIAL FLAW: Use the data without checking it */")
+    writer.add('        IO.WriteLine("" + (data + 1));', "    }", "#endif", "")
+    writer.add("#if (!OMITGOOD)")
+    # the search counts the sink of the good source as bad
+    writer.method_start("    public static void GoodG2BSink(int data)", "bad")
+    writer.add("    {")
+    writer.marker("        /* POTENTIAL FLAW: Use the data without checking it */")
+    writer.add('        IO.WriteLine("" + (data + 1));', "    }", "")
+    writer.method_start("    public static void GoodB2GSink(int data)", "good")
+    writer.add("    {")
+    writer.marker("        /* FIX: Check the value before using it */")
+    writer.add(
+        "        if (data < int.MaxValue)",
+        "        {",
+        '            IO.WriteLine("" + (data + 1));',
+        "        }",
+        "    }",
+        "#endif",
+        "}",
+        "}",
+    )
+    return writer
+
+
+def cpp_main(writer, namespace):
+    writer.add(
+        "",
+        "#ifdef INCLUDEMAIN",
+        "",
+        f"using namespace {namespace};",
+        "",
+        "int main(int argc, char * argv[])",
+        "{",
+        "    srand( (unsigned)time(NULL) );",
+        "#ifndef OMITGOOD",
+        '    printLine("Calling good()...");',
+        "    good();",
+        '    printLine("Finished good()");',
+        "#endif /* OMITGOOD */",
+        "#ifndef OMITBAD",
+        '    printLine("Calling bad()...");',
+        "    bad();",
+        '    printLine("Finished bad()");',
+        "#endif /* OMITBAD */",
+        "    return 0;",
+        "}",
+        "",
+        "#endif",
+    )
+
+
+def cpp_simple(name, dirname, cwe):
+    writer = TestCaseWriter(cwe)
+    add_header(writer, f"{name}.cpp", dirname, cwe, "sources-sink-01.tmpl.cpp")
+    writer.add(
+        '#include "std_testcase.h"',
+        "",
+        f"namespace {name}",
+        "{",
+        "",
+        "#ifndef OMITBAD",
+        "",
+    )
+    writer.method_start("void bad()", "bad")
+    writer.add("{", "    int data;", "    data = 0;")
+    writer.marker("    /* POTENTIAL FLAW: Read data from the console */")
+    writer.add(
+        '    fscanf(stdin, "%d", &data);',
+        "    printIntLine(data + 1);",
+        "}",
+        "",
+        "#endif /* OMITBAD */",
+        "",
+        "#ifndef OMITGOOD",
+        "",
+    )
+    writer.method_start("static void goodG2B()", "good")
+    writer.add("{", "    int data;", "    data = 0;")
+    writer.marker("    /* FIX: Use a hardcoded number */")
+    writer.add("    data = 2;", "    printIntLine(data + 1);", "}", "")
+    writer.method_start("static void goodB2G()", "good")
+    writer.add("{", "    int data;", "    data = 0;")
+    writer.marker("    /* POTENTIAL FLAW: Read data from the console */")
+    writer.add('    fscanf(stdin, "%d", &data);')
+    writer.marker("    /* FIX: Check the value before using it */")
+    writer.add(
+        "    if (data < INT_MAX)",
+        "    {",
+        "        printIntLine(data + 1);",
+        "    }",
+        "}",
+        "",
+    )
+    writer.method_start("void good()", "good")
+    writer.add(
+        "{",
+        "    goodG2B();",
+        "    goodB2G();",
+        "}",
+        "",
+        "#endif /* OMITGOOD */",
+        "",
+        "} /* close namespace */",
+    )
+    cpp_main(writer, name)
+    return writer
+
+
+def cpp_sources(name, dirname, cwe, namespace):
+    # the sinks are declared with ";", the search ignores the whole file
+    writer = TestCaseWriter(cwe, method=None)
+    add_header(writer, f"{name}.cpp", dirname, cwe, "sources-sinks-51a.tmpl.cpp")
+    writer.add(
+        '#include "std_testcase.h"',
+        "",
+        f"namespace {namespace}",
+        "{",
+        "",
+        "#ifndef OMITBAD",
+        "",
+        "void badSink(int data);",
+        "",
+        "void bad()",
+        "{",
+        "    int data;",
+        "    data = 0;",
+        "    /* POTENTIAL FLAW: Read data from the console */",
+        '    fscanf(stdin, "%d", &data);',
+        "    badSink(data);",
+        "}",
+        "",
+        "#endif /* OMITBAD */",
+        "",
+        "#ifndef OMITGOOD",
+        "",
+        "void goodG2BSink(int data);",
+        "",
+        "static void goodG2B()",
+        "{",
+        "    int data;",
+        "    /* FIX: Use a hardcoded number */",
+        "    data = 2;",
+        "    goodG2BSink(data);",
+        "}",
+        "",
+        "void goodB2GSink(int data);",
+        "",
+        "static void goodB2G()",
+        "{",
+        "    int data;",
+        "    data = 0;",
+        "    /* POTENTIAL FLAW: Read data from the console */",
+        '    fscanf(stdin, "%d", &data);',
+        "    goodB2GSink(data);",
+        "}",
+        "",
+        "void good()",
+        "{",
+        "    goodG2B();",
+        "    goodB2G();",
+        "}",
+        "",
+        "#endif /* OMITGOOD */",
+        "",
+        "} /* close namespace */",
+    )
+    cpp_main(writer, namespace)
+    return writer
+
+
+def cpp_sinks(name, dirname, cwe, namespace):
+    writer = TestCaseWriter(cwe, method=None)
+    add_header(writer, f"{name}.cpp", dirname, cwe, "sources-sinks-51b.tmpl.cpp")
+    writer.add(
+        '#include "std_testcase.h"',
+        "",
+        f"namespace {namespace}",
+        "{",
+        "",
+        "#ifndef OMITBAD",
+        "",
+    )
+    writer.method_start("void badSink(int data)", "bad")
+    writer.add("{")
+    writer.marker("    /* POTENTIAL FLAW: Use the data without checking it */")
+    writer.add(
+        "    printIntLine(data + 1);",
+        "}",
+        "",
+        "#endif /* OMITBAD */",
+        "",
+        "#ifndef OMITGOOD",
+        "",
+    )
+    # the search counts the sink of the good source as bad
+    writer.method_start("void goodG2BSink(int data)", "bad")
+    writer.add("{")
+    writer.marker("    /* POTENTIAL FLAW: Use the data without checking it */")
+    writer.add("    printIntLine(data + 1);", "}", "")
+    writer.method_start("void goodB2GSink(int data)", "good")
+    writer.add("{")
+    writer.marker("    /* FIX: Check the value before using it */")
+    writer.add(
+        "    if (data < INT_MAX)",
+        "    {",
+        "        printIntLine(data + 1);",
+        "    }",
+        "}",
+        "",
+        "#endif /* OMITGOOD */",
+        "",
+        "} /* close namespace */",
+    )
+    return writer
+
+
+def get_test_case(lang, dirname, cwe, number, with_sinks):
+    """Return the writers of a test case, one file or the sources and the
+    sinks files"""
+    base = f"{dirname}__synthetic_{number:06d}"
+    if not with_sinks:
+        simple = {"java": java_simple, "csharp": csharp_simple, "cpp": cpp_simple}
+        return [(f"{base}_01", simple[lang](f"{base}_01", dirname, cwe))]
+    sources, sinks = f"{base}_51a", f"{base}_51b"
+    if lang == "java":
+        return [
+            (sources, java_sources(sources, dirname, cwe, sinks)),
+            (sinks, java_sinks(sinks, dirname, cwe)),
+        ]
+    if lang == "csharp":
+        return [
+            (sources, csharp_sources(sources, dirname, cwe, sinks)),
+            (sinks, csharp_sinks(sinks, dirname, cwe)),
+        ]
+    namespace = f"{base}_51"
+    return [
+        (sources, cpp_sources(sources, dirname, cwe, namespace)),
+        (sinks, cpp_sinks(sinks, dirname, cwe, namespace)),
+    ]
+
+
+def generate_cwe_dir(outdir, lang, cwe, dirname, num_files):
+    """Write about num_files files of a CWE directory, in s01, s02, ...
+    subfolders if they are more than SUB_SIZE, and return their flaws"""
+    cwe_dir = os.path.join(outdir, "testcases", dirname)
+    flaws = {}
+    written = 0
+    number = 0
+    while written < num_files:
+        with_sinks = number % SINK_EVERY == SINK_EVERY - 1
+        test_case = get_test_case(lang, dirname, cwe, number, with_sinks)
+        subdir = cwe_dir
+        if num_files > SUB_SIZE:
+            subdir = os.path.join(cwe_dir, f"s{written // SUB_SIZE + 1:02d}")
+        os.makedirs(subdir, exist_ok=True)
+        for name, writer in test_case:
+            filename = f"{name}.{EXTENSIONS[lang]}"
+            with open(os.path.join(subdir, filename), "w") as f:
+                f.write(writer.text())
+            if writer.flaws:
+                flaws[filename] = writer.flaws
+        written += len(test_case)
+        number += 1
+    return flaws
+
+
+def generate(outdir, lang, num_files, jobs=1):
+    """Write a Juliet-like test suite of about num_files files in outdir,
+    and return its potential flaws. The CWE directories are written by
+    `jobs` processes"""
+    support_dir = os.path.join(outdir, "testcasesupport")
+    os.makedirs(support_dir, exist_ok=True)
+    with open(os.path.join(support_dir, f"IO.{EXTENSIONS[lang]}"), "w") as f:
+        f.write("/* support code, not a test case */\n")
+
+    dirs_args = []
+    for i, (cwe, name) in enumerate(CWES):
+        dir_files = num_files // len(CWES) + (1 if i < num_files % len(CWES) else 0)
+        if dir_files > 0:
+            dirs_args.append((outdir, lang, cwe, f"CWE{cwe}_{name}", dir_files))
+
+    flaws = {}
+    workers = min(scheduler.get_workers(jobs), len(dirs_args))
+    if workers == 1:
+        results = [generate_cwe_dir(*args) for args in dirs_args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(generate_cwe_dir, *zip(*dirs_args)))
+    for dir_flaws in results:
+        flaws.update(dir_flaws)
+    return flaws
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a Juliet-like test suite and its potential flaws"
+    )
+    parser.add_argument("outdir", help="The directory of the test suite")
+    parser.add_argument("lang", choices=list(EXTENSIONS))
+    parser.add_argument("num_files", type=int, help="Number of test case files")
+    parser.add_argument(
+        "--pot-flaws",
+        help="File of the potential flaws, by default pot_flaws_{lang}.json in outdir",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Parallel processes, 0 for one per CPU",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Check that search_juliet_pot_flaws finds the same potential flaws",
+    )
+    args = parser.parse_args()
+
+    flaws = generate(args.outdir, args.lang, args.num_files, jobs=args.jobs)
+    pot_flaws_file = args.pot_flaws or os.path.join(
+        args.outdir, f"pot_flaws_{args.lang}.json"
+    )
+    with open(pot_flaws_file, "w", encoding="UTF-8") as f:
+        f.write(json.dumps(flaws, indent=4, sort_keys=True))
+    print(f"Potential flaws of {len(flaws)} files written to {pot_flaws_file}")
+
+    if args.check:
+        found = pot_flaws.extract(args.outdir, jobs=args.jobs, cache_file=None)
+        if found != flaws:
+            print("FAIL: the search finds different potential flaws")
+            sys.exit(1)
+        print("OK: the search finds the same potential flaws")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,44 @@
+import os
 import sys
 import json
 
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+import lib.xml_stream as xml_stream
+
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 manifest_xml_to_json.py path/to/manifest.xml")
+    if len(sys.argv) not in [2, 3]:
+        print(
+            "Usage: python3 manifest_xml_to_json.py path/to/manifest.xml [output.json]"
+        )
         sys.exit(1)
 
     # the manifest file (XML file) given by the user
     manifest_path = sys.argv[1]
 
+    # read the file and flaw elements one at a time, the manifest is huge
     result = {}
-    with open(manifest_path, "r") as f:
-        last_filename = ""
-        for line in f.readlines():
-            if "path" in line:
-                last_filename = line.split('"')[1]
-            if "flaw" in line:
-                spl = line.split('"')
-                linenum = int(spl[1])
-                cwe = spl[3]
-                cwenum = str(int(cwe.split(":")[0].split("-")[1]))
-                if f"CWE{cwenum}" not in last_filename[:9]:
-                    continue
-                if result.get(last_filename) is None:
-                    result[last_filename] = []
-                result[last_filename].append({"line": linenum, "cwe": cwenum})
+    stream = xml_stream.XMLStream(manifest_path)
+    last_filename = ""
+    for tag, attrib in stream.iter_start({"file", "flaw"}):
+        if tag == "file":
+            last_filename = attrib["path"]
+            continue
+        linenum = int(attrib["line"])
+        cwe = attrib["name"]
+        cwenum = str(int(cwe.split(":")[0].split("-")[1]))
+        if f"CWE{cwenum}" not in last_filename[:9]:
+            continue
+        if result.get(last_filename) is None:
+            result[last_filename] = []
+        result[last_filename].append({"line": linenum, "cwe": cwenum})
 
+    if len(sys.argv) == 3:
+        with open(sys.argv[2], "w", encoding="UTF-8") as f:
+            f.write(json.dumps(result, indent=4))
+    else:
         print(json.dumps(result, indent=4))
+    stream.report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+import lib.warehouse as warehouse
+
+
+def print_rows(cur):
+    columns = [column[0] for column in cur.description]
+    print("\t".join(columns))
+    for row in cur:
+        print("\t".join(str(value) for value in row))
+
+
+def last_runs_filter(last):
+    if last is None:
+        return "", ()
+    return " AND run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?)", (last,)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the results database")
+    parser.add_argument("db", help="The SQLite database written by run.py --db")
+    parser.add_argument("--tool", "-t", help="Only the findings of this tool")
+    parser.add_argument("--lang", "-l", help="Only the findings on this language")
+    parser.add_argument("--last", type=int, help="Only the last N runs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("runs", help="List the runs and their number of findings")
+    cwe_parser = subparsers.add_parser(
+        "cwe", help="Number of findings of a CWE in every run"
+    )
+    cwe_parser.add_argument("cwe", help="The CWE number, e.g. 89")
+    file_parser = subparsers.add_parser("file", help="Findings on a file in every run")
+    file_parser.add_argument("file", help="The file name, '%%' is a wildcard")
+    subparsers.add_parser("confusion", help="Confusion matrix of every run")
+    args = parser.parse_args()
+
+    where = ""
+    params = ()
+    if args.tool is not None:
+        where += " AND tool = ?"
+        params += (args.tool,)
+    if args.lang is not None:
+        where += " AND lang = ?"
+        params += (args.lang,)
+    last_where, last_params = last_runs_filter(args.last)
+    where += last_where
+    params += last_params
+
+    conn = warehouse.connect(args.db)
+    match args.command:
+        case "runs":
+            cur = conn.execute(
+                "SELECT runs.id AS run_id, datetime(started, 'unixepoch') AS started,"
+                " tool, lang, time_sec,"
+                " (SELECT COUNT(*) FROM findings WHERE findings.run_id = tool_runs.run_id"
+                " AND findings.tool = tool_runs.tool AND findings.lang = tool_runs.lang)"
+                " AS findings"
+                " FROM runs JOIN tool_runs ON tool_runs.run_id = runs.id"
+                f" WHERE 1{where} ORDER BY run_id, tool, lang",
+                params,
+            )
+        case "cwe":
+            cur = conn.execute(
+                "SELECT run_id, tool, lang, COUNT(*) AS findings FROM findings"
+                f" WHERE cwe IN (?, ?){where}"
+                " GROUP BY run_id, tool, lang ORDER BY run_id, tool, lang",
+                (args.cwe, f"CWE-{args.cwe}") + params,
+            )
+        case "file":
+            # the file index is used only by exact matches
+            op = "LIKE" if "%" in args.file else "="
+            cur = conn.execute(
+                "SELECT run_id, tool, lang, file, line, cwe, severity, confidence"
+                f" FROM findings WHERE file {op} ?{where}"
+                " ORDER BY run_id, tool, lang, file, line",
+                (args.file,) + params,
+            )
+        case "confusion":
+            cur = conn.execute(
+                f"SELECT * FROM confusion WHERE 1{where} ORDER BY run_id, tool, lang",
+                params,
+            )
+    print_rows(cur)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import generate_findings
+
+TOOLS = ["semgrep", "snyk", "horusec", "flawfinder", "cppcheck"]
+EXTENSIONS = (".java", ".cs", ".c", ".cpp", ".h")
+# name of the setting, environment variable suffix and default value
+SETTINGS = [
+    ("latency", "LATENCY", 0.0),  # seconds of wall time of a run
+    ("cpu", "CPU", 0.0),  # seconds of CPU time of a run
+    ("mem", "MEM", 0.0),  # MB of memory held during a run
+    ("density", "DENSITY", 1.0),  # findings per test case file
+    ("seed", "SEED", 0.0),
+]
+
+
+def get_settings(tool):
+    """Read the settings from SAST_SIM_{NAME}, SAST_SIM_{TOOL}_{NAME}
+    overrides it for a single tool"""
+    settings = {}
+    for name, suffix, default in SETTINGS:
+        value = os.environ.get(f"SAST_SIM_{suffix}", default)
+        value = os.environ.get(f"SAST_SIM_{tool.upper()}_{suffix}", value)
+        settings[name] = float(value)
+    return settings
+
+
+def get_version(tool, settings):
+    # the settings are part of the version, so the cache of run.py tells
+    # apart the runs with different settings
+    values = ",".join(f"{name}={value:g}" for name, value in settings.items())
+    return f"{tool} simulator 1.0 ({values})"
+
+
+def parse_args(tool, args):
+    """Parse the command line built by benchmark.get_argv, return the tested
+    directory and the output file (None for the standard output)"""
+    parser = argparse.ArgumentParser(prog=tool)
+    match tool:
+        case "semgrep":
+            parser.add_argument("command", choices=["scan"])
+            parser.add_argument("codedir")
+            parser.add_argument("--json", action="store_true")
+            parser.add_argument("-o", "--output", dest="outfile")
+        case "horusec":
+            parser.add_argument("command", choices=["start"])
+            parser.add_argument("-p", "--project-path", dest="codedir", default=".")
+            parser.add_argument("-D", "--disable-docker", action="store_true")
+            parser.add_argument("-O", "--json-output-file", dest="outfile")
+            parser.add_argument("-o", "--output-format")
+        case "snyk":
+            parser.add_argument("command", choices=["code"])
+            parser.add_argument("subcommand", choices=["test"])
+            parser.add_argument("codedir")
+            parser.add_argument("--json-file-output", dest="outfile")
+        case "flawfinder":
+            parser.add_argument("-F", "--falsepositive", action="store_true")
+            parser.add_argument("--sarif", action="store_true")
+            parser.add_argument("codedir")
+        case "cppcheck":
+            parser.add_argument("--template")
+            parser.add_argument("-q", "--quiet", action="store_true")
+            parser.add_argument("codedir")
+            parser.add_argument("--output-file", dest="outfile")
+    args = parser.parse_args(args)
+    return args.codedir, getattr(args, "outfile", None)
+
+
+def get_cwes(files):
+    """Return the CWEs of the findings of the files, the CWE in their name
+    or one of generate_findings.CWES"""
+    cwes = set(generate_findings.CWES)
+    for path in files:
+        cwes.update(get_file_cwes(os.path.basename(path)))
+    return sorted(cwes, key=int)
+
+
+def get_file_cwes(filename):
+    return [part[3:] for part in filename.split("_") if part.startswith("CWE")]
+
+
+def list_files(codedir):
+    files = []
+    for root, dirs, filenames in os.walk(codedir):
+        dirs.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(EXTENSIONS):
+                files.append(os.path.join(root, filename))
+    return files
+
+
+def burn_cpu(seconds):
+    block = b"\x00" * 4096
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        hashlib.sha256(block).digest()
+
+
+def iter_findings(tool, codedir, files, settings):
+    """Yield the findings (path, line, cwe) of the test case files. The
+    latency and the CPU time are spread over the files, so the report grows
+    during the run like the one of a real tool. The findings of a file only
+    depend on its name and on the seed, so a run on a part of the suite
+    finds the same ones of a run on the whole suite"""
+    sleep_per_file = settings["latency"] / max(len(files), 1)
+    cpu_per_file = settings["cpu"] / max(len(files), 1)
+    for path in files:
+        time.sleep(sleep_per_file)
+        burn_cpu(cpu_per_file)
+        filename = os.path.basename(path)
+        cwes = get_file_cwes(filename)
+        if not cwes:
+            continue
+        with open(path, "rb") as f:
+            num_lines = max(f.read().count(b"\n"), 1)
+
+        rand = random.Random(f"{settings['seed']:g}:{tool}:{filename}")
+        density = settings["density"]
+        num = int(density) + (1 if rand.random() < density % 1 else 0)
+        # paths as reported by each tool
+        if tool in ["snyk", "horusec"]:
+            path = os.path.relpath(path, codedir)
+        for _ in range(num):
+            # most findings have the CWE of the test case
+            cwe = cwes[0]
+            if rand.random() > 0.6:
+                cwe = rand.choice(generate_findings.CWES)
+            yield path, rand.randint(1, num_lines), cwe
+
+
+def run(tool, args):
+    settings = get_settings(tool)
+    if args in [["--version"], ["version"]]:
+        print(get_version(tool, settings))
+        return 0
+
+    codedir, outfile = parse_args(tool, args)
+    # the memory is touched, so it's resident for the whole run
+    ballast = b"\x01" * int(settings["mem"] * 1024 * 1024)
+    files = list_files(codedir)
+    findings = iter_findings(tool, codedir, files, settings)
+    returncode = 0
+    match tool:
+        case "semgrep":
+            generate_findings.write_semgrep(outfile, findings)
+        case "horusec":
+            generate_findings.write_horusec(outfile, findings, int(settings["seed"]))
+        case "snyk":
+            # snyk writes no file and returns 0 when there are no findings
+            findings = list(findings)
+            if findings:
+                generate_findings.write_sarif(outfile, findings, get_cwes(files))
+                returncode = 1
+        case "flawfinder":
+            generate_findings.write_sarif("/dev/stdout", findings, get_cwes(files))
+        case "cppcheck":
+            generate_findings.write_cppcheck(outfile, findings)
+    del ballast
+    return returncode
+
+
+def install(bindir):
+    """Write an executable named like each tool in bindir, that runs its
+    simulator"""
+    os.makedirs(bindir, exist_ok=True)
+    script = os.path.abspath(__file__)
+    for tool in TOOLS:
+        path = os.path.join(bindir, tool)
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" {tool} "$@"\n')
+        os.chmod(path, 0o755)
+        print(path)
+
+
+def main():
+    tool = os.path.basename(sys.argv[0])
+    args = sys.argv[1:]
+    if tool not in TOOLS:
+        if len(args) == 2 and args[0] == "--install":
+            install(args[1])
+            return
+        if not args or args[0] not in TOOLS:
+            print(
+                "Usage: python3 sast_simulator.py --install path/to/bin\n"
+                + f"       python3 sast_simulator.py {{{','.join(TOOLS)}}} [args]"
+            )
+            sys.exit(1)
+        tool, args = args[0], args[1:]
+    sys.exit(run(tool, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import os
 import sys
-import json
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+import lib.cwe_index as cwe_index
 
 
 def full_traversal(cwe, tree):
@@ -20,13 +23,7 @@ def test_traversal(cwe_tree):
 def is_cwe_ancestor(cwe, ancestor, tree):
     """Returns true if the given ancestor is an ancestor of the given cwe
     or the cwe and the ancestor are equal"""
-    if cwe == ancestor:
-        return True
-
-    for parent in tree.get(cwe, []):
-        if is_cwe_ancestor(parent, ancestor, tree):
-            return True
-    return False
+    return tree.is_ancestor(cwe, ancestor)
 
 
 def test_ancestor(cwe1, cwe2, cwe_tree, value):
@@ -38,7 +35,7 @@ def test_ancestor(cwe1, cwe2, cwe_tree, value):
 
 
 def cwe_relationship(first_cwe, second_cwe, cwe_tree):
-    if first_cwe == cwe_tree:
+    if first_cwe == second_cwe:
         return f"CWE {first_cwe} is equal to CWE {second_cwe}"
 
     if is_cwe_ancestor(first_cwe, second_cwe, cwe_tree):
@@ -58,16 +55,14 @@ def main():
 
     # the cwe tree file given by the user
     cwe_json_file_path = sys.argv[1]
-    # Read the cwe tree from file
-    cwe_tree = {}
-    with open(cwe_json_file_path, "r") as f:
-        cwe_tree = json.load(f)
+    # Read the cwe tree index, built from the tree if needed
+    cwe_tree = cwe_index.load(cwe_json_file_path)
 
     if len(sys.argv) == 4:
         print(cwe_relationship(sys.argv[2], sys.argv[3], cwe_tree))
         return
 
-    # test_traversal(cwe_tree)
+    # test_traversal(cwe_tree.tree)
     test_ancestor("118", "664", cwe_tree, True)
     test_ancestor("664", "118", cwe_tree, False)
     test_ancestor("120", "119", cwe_tree, True)